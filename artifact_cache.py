@@ -0,0 +1,97 @@
+# Persistent, content-addressed cache for generated artifacts (chart snippets,
+# ZIP bundles).
+#
+# Keys are hashes of everything an artifact depends on: the input rows, the
+# selected columns and the template version (see make_key). A hit returns the
+# stored bytes as-is. The cache is bounded in size; when it grows past
+# max_bytes the least recently used entries (oldest mtime, bumped on every hit)
+# are evicted. Writes are atomic, so several processes and threads can share a
+# directory.
+
+import hashlib
+import json
+import os
+import tempfile
+
+
+# Function to build a cache key from any JSON-serializable parts
+def make_key(*parts):
+    payload = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ArtifactCache:
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    # Function to list (path, size, mtime) for every entry
+    def _entries(self):
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # Evicted by another process
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Every write gets its own temp file, so concurrent writers of a key never share one
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{key}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            os.remove(tmp_path)
+            if not os.path.exists(path):
+                raise
+            return  # Another writer stored the same key first; entries are content-addressed
+        self._size += len(data)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    # Function to return the cached bytes for a key, building and storing them on a miss
+    def get_or_build(self, key, build):
+        data = self.get(key)
+        if data is None:
+            data = build()
+            self.put(key, data)
+        return data
+
+    # Remove least recently used entries until the cache is back under 90% of max_bytes
+    def evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
@@ -0,0 +1,625 @@
+# Builders for everything the app exports for a URL: the master table, the
+# per-provider and overall Chart.js snippets, the overall score tables, the
+# Features Matrix category tables and the ZIP bundles.
+#
+# Nothing in here depends on Streamlit, so the same code backs the Streamlit
+# page (brand.py) and the headless batch generator (batch.py).
+
+import io
+import json
+import os
+import re
+import uuid  # For generating unique IDs
+import zipfile
+
+import pandas as pd
+
+from artifact_cache import make_key
+from chart_templates import CHART_BOOTSTRAP_FILE, CHART_BOOTSTRAP_HTML, render_chart_snippet
+from consolidated import extract_url_data, iter_url_rows, url_fingerprint
+from instrumentation import stage
+from static_charts import render_chart_images
+
+# Bump when the chart or table templates change so cached artifacts are rebuilt
+TEMPLATE_VERSION = 3
+
+# Chart colors per provider (keyed by lower-case provider name)
+VPN_COLORS = {
+    'nordvpn': 'rgba(62, 95, 255, 0.8)',
+    'surfshark': 'rgba(30, 191, 191, 0.8)',
+    'expressvpn': 'rgba(218, 57, 64, 0.8)',
+    'ipvanish': 'rgba(112, 187, 68, 0.8)',
+    'cyberghost': 'rgba(255, 204, 0.8)',
+    'purevpn': 'rgba(133, 102, 231, 0.8)',
+    'protonvpn': 'rgba(109, 74, 255, 0.8)',
+    'privatevpn': 'rgba(159, 97, 185, 0.8)',
+    'pia': 'rgba(109, 200, 98, 0.8)',
+    'hotspot shield': 'rgba(109, 192, 250, 0.8)',
+    'strongvpn': 'rgba(238, 170, 29, 0.8)'
+}
+DEFAULT_VPN_COLOR = 'rgba(75, 192, 192, 0.8)'
+
+# Master table columns, in display order
+MASTER_TABLE_COLUMNS = [
+    'VPN Provider',
+    'Ease of Use: Overall Score',
+    'Security & Privacy: Overall Score',
+    'Streaming Ability: Overall Score',
+    'UK Speed: Overall Score',
+    'Value for Money: Overall Score'
+]
+
+
+# Function to sanitize filenames
+def sanitize_filename(filename):
+    return re.sub(r'[^A-Za-z0-9_\-\.]', '_', filename)
+
+
+# Function to get the chart color for a provider
+def get_provider_color(provider_name):
+    return VPN_COLORS.get(provider_name.lower(), DEFAULT_VPN_COLOR)
+
+
+# Function to get the base file name for a URL's downloads
+def get_url_slug(url):
+    return sanitize_filename(url.split('/')[-1])
+
+
+# Function to get the folder name for a URL's files (host and path, without the scheme)
+def get_url_folder(url):
+    return sanitize_filename(re.sub(r'^https?://', '', url.strip()).strip('/'))
+
+
+# Function to build a text artifact, going through the artifact cache when one is given
+def cached_text(cache, key_parts, build):
+    if cache is None:
+        return build()
+    key = make_key(TEMPLATE_VERSION, *key_parts)
+    return cache.get_or_build(key, lambda: build().encode('utf-8')).decode('utf-8')
+
+
+# Create a mapping from provider names to IDs from the 'provider-ids' sheet
+def build_provider_id_mapping(provider_ids_data):
+    provider_id_mapping = {}
+    for row in provider_ids_data[1:]:  # Skip header row
+        if len(row) >= 2:
+            provider_name_map = row[0].strip()
+            provider_id = row[1].strip()
+            provider_id_mapping[provider_name_map] = provider_id
+    return provider_id_mapping
+
+
+# Build the master table of overall scores (excluding 'Average' columns).
+# Returns None when there are no such scores, otherwise a dict with the full
+# table, the table to display, the table with provider IDs and the providers
+# missing from the ID mapping.
+def build_master_tables(provider_names, overall_scores_data, overall_score_headers_list, provider_id_mapping):
+    # Exclude 'Average' from master table overall scores
+    master_overall_score_headers_list = [header for header in overall_score_headers_list if 'average' not in header.lower()]
+    if not master_overall_score_headers_list:
+        return None
+
+    master_table_data = []
+    for provider_name in provider_names:
+        provider_entry = {'VPN Provider': provider_name}
+        for score_type in master_overall_score_headers_list:
+            score_value = overall_scores_data.get(score_type, {}).get(provider_name, 0)
+            provider_entry[score_type] = score_value
+        master_table_data.append(provider_entry)
+
+    # Create DataFrame
+    master_df = pd.DataFrame(master_table_data)
+
+    # Convert numeric columns to floats
+    numeric_columns = master_df.columns.drop('VPN Provider')
+    master_df[numeric_columns] = master_df[numeric_columns].apply(pd.to_numeric, errors='coerce')
+
+    # Sort by 'Overall Score' if it exists
+    if 'Overall Score' in master_df.columns:
+        master_df = master_df.sort_values(by='Overall Score', ascending=False)
+    else:
+        # If 'Overall Score' is not present, sort by the first overall score column
+        first_score_column = [col for col in master_df.columns if col != 'VPN Provider'][0]
+        master_df = master_df.sort_values(by=first_score_column, ascending=False)
+    master_df.reset_index(drop=True, inplace=True)
+
+    # Remove 'Overall Score' column from displayed table
+    if 'Overall Score' in master_df.columns:
+        master_df_display = master_df.drop(columns=['Overall Score'])
+    else:
+        master_df_display = master_df.copy()
+
+    # Keep only the columns that are present in master_df_display, in display order
+    columns_to_display = [col for col in MASTER_TABLE_COLUMNS if col in master_df_display.columns]
+    master_df_display = master_df_display[columns_to_display].copy()
+
+    # Round numerical columns to two decimal places for display
+    numeric_columns_display = [col for col in master_df_display.columns if col != 'VPN Provider']
+    master_df_display[numeric_columns_display] = master_df_display[numeric_columns_display].apply(pd.to_numeric, errors='coerce').round(2)
+
+    # Create a copy of master_df and replace 'VPN Provider' with IDs
+    master_df_with_ids = master_df.copy()
+    mapped_ids = master_df_with_ids['VPN Provider'].map(provider_id_mapping)
+
+    # Identify providers not found in mapping
+    missing_providers = master_df_with_ids.loc[mapped_ids.isna(), 'VPN Provider'].unique()
+
+    # Replace 'VPN Provider' column with mapped IDs, 'Unknown' when not found
+    master_df_with_ids['VPN Provider'] = mapped_ids.fillna('Unknown')
+
+    # Rename 'VPN Provider' column to 'ID'
+    master_df_with_ids.rename(columns={'VPN Provider': 'ID'}, inplace=True)
+
+    # Remove 'Overall Score' column if it exists
+    if 'Overall Score' in master_df_with_ids.columns:
+        master_df_with_ids.drop(columns=['Overall Score'], inplace=True)
+
+    # Strip ': Overall Score' from column headers
+    new_columns = {}
+    for col in master_df_with_ids.columns:
+        new_col = col.replace(': Overall Score', '')
+        new_columns[col] = new_col
+    master_df_with_ids.rename(columns=new_columns, inplace=True)
+
+    return {
+        'table': master_df,
+        'display_table': master_df_display,
+        'table_with_ids': master_df_with_ids,
+        'missing_providers': missing_providers,
+    }
+
+
+# Chart spec (kind, labels, datasets, title) for one provider's speed tests.
+# The same spec drives the Chart.js snippet and the static images.
+def provider_chart_spec(provider_name, labels, data_values, article_name):
+    return {
+        'kind': 'provider',
+        'labels': labels,
+        'datasets': [{'label': provider_name, 'data': data_values, 'color': get_provider_color(provider_name)}],
+        'title': f"{provider_name} Speed Tests for {article_name}",
+    }
+
+
+# Generate the Chart.js snippet for one provider's speed tests
+def build_provider_chart(provider_name, labels, data_values, article_name):
+    # Generate unique IDs
+    chart_id = f"{provider_name}_chart_{uuid.uuid4().hex[:6]}"
+
+    spec = provider_chart_spec(provider_name, labels, data_values, article_name)
+    chart_title = spec['title']
+
+    # Generate meta description
+    meta_description = f"This chart shows the speed test results for {provider_name} when used for {article_name.lower()}."
+
+    # Generate schema data with creator and license
+    data_schema = {
+        "@context": "http://schema.org",
+        "@type": "Dataset",
+        "name": chart_title,
+        "description": meta_description,
+        "creator": "Comparitech Ltd",
+        "license": "https://creativecommons.org/licenses/by/4.0/",
+        "data": {
+            provider_name: {
+                label: f"{value} Mbps" for label, value in zip(labels, data_values)
+            }
+        }
+    }
+    return render_chart_snippet('provider', chart_id, labels, spec['datasets'], chart_title, data_schema)
+
+
+# Generate per-provider charts as a list of (filepath, content)
+def build_provider_charts(speed_test_data_per_provider, cache=None):
+    provider_level_charts = []
+    for provider_name, provider_info in speed_test_data_per_provider.items():
+        labels, data_values = provider_info.get('data', ([], []))
+        article_name = provider_info.get('article_name', 'VPN Analysis')
+        speed_test_chart_js = cached_text(
+            cache, ('provider_chart', provider_name, labels, data_values, article_name),
+            lambda: build_provider_chart(provider_name, labels, data_values, article_name)
+        )
+
+        filename = sanitize_filename(f"{provider_name}_data_chart.txt")
+        filepath = os.path.join('Provider Level Charts', filename)
+        provider_level_charts.append((filepath, speed_test_chart_js))
+    return provider_level_charts
+
+
+# Chart spec (kind, labels, datasets, title) comparing all providers on one overall score
+def overall_chart_spec(score_type, provider_names, overall_scores_data):
+    # Retrieve the article name from overall_scores_data
+    article_name = overall_scores_data.get(score_type, {}).get('article_name', 'VPN Analysis')
+    return {
+        'kind': 'overall',
+        'labels': [score_type],
+        'datasets': [
+            {
+                'label': provider_name,
+                'data': [overall_scores_data.get(score_type, {}).get(provider_name, 0)],
+                'color': get_provider_color(provider_name),
+            }
+            for provider_name in provider_names
+        ],
+        'title': f"{score_type} for {article_name}",
+    }
+
+
+# Generate the Chart.js snippet comparing all providers on one overall score
+def build_overall_chart(score_type, provider_names, overall_scores_data):
+    spec = overall_chart_spec(score_type, provider_names, overall_scores_data)
+    labels = spec['labels']
+    article_name = overall_scores_data.get(score_type, {}).get('article_name', 'VPN Analysis')
+
+    # Generate unique IDs
+    chart_id = f"overall_{score_type.replace(' ', '_').lower()}_{uuid.uuid4().hex[:6]}"
+
+    chart_title = spec['title']
+
+    # Generate meta description
+    meta_description = f"This chart shows the {score_type.lower()} for each VPN provider when used for {article_name.lower()}."
+
+    # Generate schema data with creator and license
+    data_schema = {
+        "@context": "http://schema.org",
+        "@type": "Dataset",
+        "name": chart_title,
+        "description": meta_description,
+        "creator": "Comparitech Ltd",
+        "license": "https://creativecommons.org/licenses/by/4.0/",
+        "data": {
+            provider_name: {
+                labels[0]: f"{overall_scores_data.get(score_type, {}).get(provider_name, 0)} Score out of 10"
+            } for provider_name in provider_names
+        }
+    }
+    return render_chart_snippet('overall', chart_id, labels, spec['datasets'], chart_title, data_schema)
+
+
+# Generate one overall chart per score type as a list of (filepath, content)
+def build_overall_charts(selected_overall_scores, provider_names, overall_scores_data, cache=None):
+    overall_charts = []
+    for score_type in selected_overall_scores:
+        overall_score_chart_js = cached_text(
+            cache, ('overall_chart', score_type, provider_names, overall_scores_data.get(score_type, {})),
+            lambda: build_overall_chart(score_type, provider_names, overall_scores_data)
+        )
+        filename = sanitize_filename(f"{score_type}_chart.txt")
+        overall_charts.append((os.path.join('Overall Charts', filename), overall_score_chart_js))
+    return overall_charts
+
+
+# Build the table for one overall score, sorted by score
+def build_overall_table(score_type, provider_names, overall_scores_data):
+    score_table_data = []
+    for provider_name in provider_names:
+        score_value = overall_scores_data.get(score_type, {}).get(provider_name, 0)
+        score_table_data.append({'VPN Provider': provider_name, score_type: score_value})
+    df = pd.DataFrame(score_table_data)
+
+    # Convert numeric columns to floats
+    numeric_columns = df.columns.drop('VPN Provider')
+    df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
+
+    # Sort df by the score_type column in descending order
+    df = df.sort_values(by=score_type, ascending=False)
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+
+# The Features Matrix pivoted by category once per snapshot: for each category
+# a table with one row per provider (plus the 'Category' row) and one column
+# per feature. The tables for a URL are then a row subset, memoized on the
+# sorted provider tuple since many articles share the same line-up.
+class FeatureMatrixPivots:
+    MAX_PROVIDER_SETS = 1024
+
+    def __init__(self, features_matrix_data):
+        self.provider_columns = []
+        self.category_pivots = {}
+        self._outputs = {}
+        if not features_matrix_data:
+            return
+
+        # Convert the Features Matrix data to a DataFrame
+        features_matrix_df = pd.DataFrame(features_matrix_data[1:], columns=features_matrix_data[0])
+
+        # Get the list of VPN Provider columns by excluding 'Category' and 'Feature'
+        self.provider_columns = [col for col in features_matrix_df.columns if col not in ['Category', 'Feature']]
+
+        # Group by 'Category', set 'Feature' as index and transpose
+        for category, data in features_matrix_df.groupby('Category'):
+            self.category_pivots[category] = data.set_index('Feature').T
+
+    # Build the transposed table for each category, limited to the given providers
+    def tables(self, provider_names):
+        provider_names = set(provider_names)
+        filtered_provider_columns = [col for col in self.provider_columns if col in provider_names]
+        if not filtered_provider_columns:
+            return {}
+
+        category_tables = {}
+        for category, pivot in self.category_pivots.items():
+            # Reset index to get 'VPN Provider' as a column
+            category_table = pivot.loc[['Category'] + filtered_provider_columns]
+            category_tables[category] = category_table.reset_index().rename(columns={'index': 'VPN Provider'})
+        return category_tables
+
+    # Function to get the tables and their CSVs for the given providers as
+    # ([(category, dataframe, filepath)], [(filepath, csv bytes)]). The result
+    # is shared between callers and must not be modified.
+    def outputs(self, provider_names):
+        key = tuple(sorted(set(provider_names)))
+        outputs = self._outputs.get(key)
+        if outputs is None:
+            feature_tables = []
+            feature_table_files = []
+            for category, table in self.tables(provider_names).items():
+                filepath = os.path.join('Features Matrix Tables', f"{category}_category_table.csv")
+                feature_tables.append((category, table, filepath))
+                feature_table_files.append((filepath, to_csv_bytes(table)))
+            outputs = (feature_tables, feature_table_files)
+            if len(self._outputs) >= self.MAX_PROVIDER_SETS:
+                self._outputs.pop(next(iter(self._outputs)), None)
+            self._outputs[key] = outputs
+        return outputs
+
+    # The memoized outputs are not sent along to worker processes
+    def __getstate__(self):
+        return dict(self.__dict__, _outputs={})
+
+
+# Build the transposed Features Matrix table for each category, limited to the given providers
+def build_feature_tables(features_matrix_data, provider_names):
+    return FeatureMatrixPivots(features_matrix_data).tables(provider_names)
+
+
+# Function to map each provider to its Features Matrix column (Category and Feature rows included)
+def feature_columns(features_matrix_data):
+    if not features_matrix_data:
+        return {}
+    header = features_matrix_data[0]
+    key_indexes = [index for index, col in enumerate(header) if col in ['Category', 'Feature']]
+    columns = {}
+    for index, col in enumerate(header):
+        if index in key_indexes:
+            continue
+        columns.setdefault(col, []).append([
+            [row[i] if i < len(row) else '' for i in key_indexes + [index]] for row in features_matrix_data[1:]
+        ])
+    return columns
+
+
+# Function to keep only the reference data a URL's outputs read: the provider
+# IDs and the Features Matrix columns of its providers
+def url_reference_data(provider_names, provider_ids_data, features_matrix_data):
+    provider_id_mapping = build_provider_id_mapping(provider_ids_data)
+    columns = feature_columns(features_matrix_data)
+    return (
+        {provider_name: provider_id_mapping.get(provider_name) for provider_name in provider_names},
+        {provider_name: columns.get(provider_name) for provider_name in provider_names},
+    )
+
+
+# Paths of the master tables inside the tables bundle
+MASTER_TABLE_FILE = 'Overall Tables/master_overall_scores.csv'
+MASTER_TABLE_WITH_IDS_FILE = 'Overall Tables/master_overall_scores_with_ids.csv'
+
+
+# Function to serialize a table to CSV bytes
+def to_csv_bytes(df):
+    return df.to_csv(index=False).encode('utf-8')
+
+
+# Render static images for [(base filepath, chart spec)] and return
+# (filepath, bytes) per chart and format, e.g. 'Overall Charts/x_chart.svg'.
+# Images already in the artifact cache are not re-rendered; the rest are
+# rendered together, in parallel when an executor is given.
+def build_chart_images(image_specs, formats, cache=None, executor=None):
+    keys = [
+        {fmt: make_key(TEMPLATE_VERSION, 'chart_image', fmt, spec) for fmt in formats}
+        for _, spec in image_specs
+    ]
+    images = [
+        {fmt: cache.get(key) for fmt, key in chart_keys.items()} if cache is not None else {}
+        for chart_keys in keys
+    ]
+    missing = [index for index, chart_images in enumerate(images) if any(chart_images.get(fmt) is None for fmt in formats)]
+    rendered = render_chart_images([image_specs[index][1] for index in missing], formats, executor)
+    for index, chart_images in zip(missing, rendered):
+        images[index] = chart_images
+        if cache is not None:
+            for fmt, data in chart_images.items():
+                cache.put(keys[index][fmt], data)
+
+    image_files = []
+    for (base_path, _), chart_images in zip(image_specs, images):
+        for fmt in formats:
+            image_files.append((f"{base_path}.{fmt}", chart_images[fmt]))
+    return image_files
+
+
+# Build every chart and table for a URL. overall_score_headers_list is every
+# overall score available for the URL (the master table uses all of them);
+# charts and tables are only generated for selected_overall_scores.
+# Chart snippets go through the artifact cache when one is given.
+# image_formats ('svg', 'png') adds static renders of every chart next to its
+# snippet; executor is an optional process pool for rendering them.
+#
+# Each chart and table is serialized exactly once: 'chart_files' and
+# 'table_files' hold (filepath, bytes) in bundle order, and the individual
+# downloads and all ZIP bundles share those bytes.
+def build_url_outputs(dataset, url, selected_columns, selected_overall_scores, overall_score_headers_list, provider_ids_data, features_matrix_data, cache=None,
+                      image_formats=(), executor=None, feature_outputs=None, feature_pivots=None):
+    # Extract the selected columns and overall scores for each provider
+    with stage('extract') as record:
+        provider_names, speed_test_data_per_provider, overall_scores_data = extract_url_data(
+            dataset, url, selected_columns, overall_score_headers_list
+        )
+        record['rows'] = len(provider_names)
+
+    overall_table_files = []  # List of (filepath, csv bytes)
+    with stage('master_table') as record:
+        master_tables = build_master_tables(
+            provider_names, overall_scores_data, overall_score_headers_list, build_provider_id_mapping(provider_ids_data)
+        )
+        if master_tables is not None:
+            overall_table_files.append((MASTER_TABLE_FILE, to_csv_bytes(master_tables['table'])))
+            overall_table_files.append((MASTER_TABLE_WITH_IDS_FILE, to_csv_bytes(master_tables['table_with_ids'])))
+            record['rows'] = len(master_tables['table'])
+        record['bytes'] = sum(len(content) for _, content in overall_table_files)
+
+    # Generate per-provider charts
+    chart_files = []  # List of (filepath, content bytes)
+    image_specs = []  # List of (filepath without extension, chart spec) for static images
+    if selected_columns:
+        with stage('provider_charts', rows=len(speed_test_data_per_provider)) as record:
+            for filepath, content in build_provider_charts(speed_test_data_per_provider, cache):
+                chart_files.append((filepath, content.encode('utf-8')))
+            record['bytes'] = sum(len(content) for _, content in chart_files)
+        if image_formats:
+            for provider_name, provider_info in speed_test_data_per_provider.items():
+                labels, data_values = provider_info.get('data', ([], []))
+                spec = provider_chart_spec(provider_name, labels, data_values, provider_info.get('article_name', 'VPN Analysis'))
+                filepath = os.path.join('Provider Level Charts', sanitize_filename(f"{provider_name}_data_chart"))
+                image_specs.append((filepath, spec))
+
+    # Generate overall score charts
+    with stage('overall_charts', rows=len(selected_overall_scores)) as record:
+        overall_chart_files = [
+            (filepath, content.encode('utf-8'))
+            for filepath, content in build_overall_charts(selected_overall_scores, provider_names, overall_scores_data, cache)
+        ]
+        if image_formats:
+            for score_type in selected_overall_scores:
+                spec = overall_chart_spec(score_type, provider_names, overall_scores_data)
+                image_specs.append((os.path.join('Overall Charts', sanitize_filename(f"{score_type}_chart")), spec))
+        chart_files.extend(overall_chart_files)
+        record['bytes'] = sum(len(content) for _, content in overall_chart_files)
+
+    # Generate overall score tables
+    overall_score_tables = []  # List of (score_type, dataframe, filepath)
+    with stage('overall_tables', rows=len(selected_overall_scores)) as record:
+        for score_type in selected_overall_scores:
+            df = build_overall_table(score_type, provider_names, overall_scores_data)
+            filepath = os.path.join('Overall Tables', f"{sanitize_filename(score_type.lower())}_table.csv")
+            overall_score_tables.append((score_type, df, filepath))
+            overall_table_files.append((filepath, to_csv_bytes(df)))
+            record['bytes'] = (record['bytes'] or 0) + len(overall_table_files[-1][1])
+
+    # Static images go after the snippets
+    if image_specs:
+        with stage('chart_images', rows=len(image_specs)) as record:
+            image_files = build_chart_images(image_specs, image_formats, cache, executor)
+            chart_files.extend(image_files)
+            record['bytes'] = sum(len(content) for _, content in image_files)
+
+    # Ship the shared bootstrap the chart snippets rely on
+    if chart_files:
+        chart_files.insert(0, (CHART_BOOTSTRAP_FILE, CHART_BOOTSTRAP_HTML.encode('utf-8')))
+
+    # Process the Features Matrix for the selected providers, unless the caller
+    # already has it (it only depends on the URL's providers, not the selections)
+    if feature_outputs is None:
+        feature_outputs = build_feature_outputs(features_matrix_data, provider_names, feature_pivots)
+    feature_tables, feature_table_files = feature_outputs
+
+    return {
+        'provider_names': provider_names,
+        'master_tables': master_tables,
+        'overall_score_tables': overall_score_tables,
+        'feature_tables': feature_tables,
+        'chart_files': chart_files,
+        'table_files': feature_table_files + overall_table_files,
+    }
+
+
+# Build the Features Matrix tables for the given providers as
+# ([(category, dataframe, filepath)], [(filepath, csv bytes)]), from the
+# snapshot's pivots when they are given
+def build_feature_outputs(features_matrix_data, provider_names, feature_pivots=None):
+    with stage('features_matrix', rows=max(len(features_matrix_data) - 1, 0)) as record:
+        if feature_pivots is None:
+            feature_pivots = FeatureMatrixPivots(features_matrix_data)
+        feature_tables, feature_table_files = feature_pivots.outputs(provider_names)
+        record['bytes'] = sum(len(content) for _, content in feature_table_files)
+    return feature_tables, feature_table_files
+
+
+# Function to write a DEFLATE-compressed ZIP of (filepath, bytes) members to a file object
+def write_zip(fileobj, members):
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for filepath, content in members:
+            zf.writestr(filepath, content)
+
+
+# Function to build a ZIP archive in memory and return its bytes. The buffer's
+# bytes are handed over as they are, without a second copy; to stream an
+# archive to disk, call write_zip with the open file instead.
+def build_zip(members):
+    buffer = io.BytesIO()
+    write_zip(buffer, members)
+    return buffer.getvalue()
+
+
+# Describe the ZIP downloads for a URL's outputs as (label, file_name, members).
+# Nothing is compressed here; call build_zip/bundle_data when a bundle is
+# actually needed. The everything bundle reuses the members of the other two.
+def get_bundle_specs(url, outputs):
+    url_slug = get_url_slug(url)
+    charts = outputs['chart_files']
+    tables = outputs['table_files']
+
+    bundle_specs = []
+    if charts:
+        bundle_specs.append(("Download Chart.js Files as ZIP", f"{url_slug}_charts.zip", charts))
+    if tables:
+        bundle_specs.append(("Download All Tables as ZIP", f"{url_slug}_tables.zip", tables))
+    if charts and tables:
+        everything = [(os.path.join('Charts', filepath), content) for filepath, content in charts]
+        everything += [(os.path.join('Tables', filepath), content) for filepath, content in tables]
+        bundle_specs.append(("Download Everything", f"{url_slug}_everything.zip", everything))
+    return bundle_specs
+
+
+# Key for a URL's ZIP bundles: the URL's input rows, the selections, the
+# provider-ids and Features Matrix entries of its providers and the template
+# version. Edits to other providers' reference rows leave the key unchanged.
+def url_bundle_key(dataset, url, selected_columns, selected_overall_scores, provider_ids_data, features_matrix_data,
+                   image_formats=()):
+    return make_key(
+        TEMPLATE_VERSION, 'url_bundles', url, url_fingerprint(dataset, url),
+        selected_columns, selected_overall_scores, list(image_formats),
+        url_reference_data([provider_name for _, _, provider_name in iter_url_rows(dataset, url)], provider_ids_data, features_matrix_data)
+    )
+
+
+# Function to get one bundle's ZIP bytes, from the artifact cache when one is given
+def bundle_data(cache, bundle_key, file_name, members):
+    with stage('bundles', rows=len(members)) as record:
+        if cache is None:
+            data = build_zip(members)
+        else:
+            data = cache.get_or_build(make_key(bundle_key, file_name), lambda: build_zip(members))
+        record['bytes'] = len(data)
+    return data
+
+
+# Function to get a URL's bundles from the artifact cache as (label, file_name, data),
+# None unless all of them are present
+def get_cached_bundles(cache, bundle_key):
+    index = cache.get(bundle_key)
+    if index is None:
+        return None
+    bundles = []
+    for label, file_name in json.loads(index):
+        data = cache.get(make_key(bundle_key, file_name))
+        if data is None:
+            return None
+        bundles.append((label, file_name, data))
+    return bundles
+
+
+# Function to record which bundles a URL has, once they are all in the artifact cache
+def put_bundle_index(cache, bundle_key, bundle_specs):
+    index = [[label, file_name] for label, file_name, _ in bundle_specs]
+    cache.put(bundle_key, json.dumps(index).encode('utf-8'))
@@ -0,0 +1,193 @@
+# Headless batch generator: builds the chart and table ZIP bundles for every
+# URL in the Consolidated sheet, the same files the download buttons produce.
+#
+# The workbook is loaded and parsed once, then the URLs are spread across a
+# process pool. Each URL gets its own folder in the output directory.
+#
+# Usage:
+#   python batch.py <output_dir> --snapshot-dir snapshot/
+#   python batch.py <output_dir> --credentials service_account.json \
+#       --columns "UK Speed: Download" "US Speed: Download" --workers 8
+#
+# Without --overall-scores every overall score available for a URL is used,
+# which matches the default selection in the UI.
+#
+# With --cache-dir, bundles are stored in a content-addressed artifact cache;
+# on later runs only URLs whose rows (or the selections) changed are rebuilt.
+#
+# --images svg png adds static renders of every chart to the chart bundles.
+# They are rendered inside each URL's worker, so the pool already spreads them
+# across processes. PNG needs the cairo library; without it the run stops
+# before loading anything.
+#
+# --metrics-log writes one JSON line per URL with its stage timings to stderr.
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import engine
+import instrumentation
+from artifact_cache import ArtifactCache
+from artifacts import get_cached_bundles, get_url_folder, put_bundle_index, write_zip
+from quota import QuotaScheduler
+from sheets import SHEET_URL, authorize_client
+from static_charts import IMAGE_FORMATS, png_available
+
+# Data shared by every URL, set once per worker process
+_worker_data = {}
+
+
+def _init_worker(dataset, provider_ids_data, features_matrix_data, cache_dir, cache_mb, metrics_log=False):
+    if metrics_log:
+        instrumentation.configure_json_logging()
+    _worker_data['dataset'] = dataset
+    _worker_data['provider_ids_data'] = provider_ids_data
+    _worker_data['features_matrix_data'] = features_matrix_data
+    _worker_data['feature_pivots'] = engine.build_feature_pivots(features_matrix_data)
+    _worker_data['cache'] = ArtifactCache(cache_dir, cache_mb * 1024 * 1024) if cache_dir else None
+
+
+# Generate and write the bundles for one URL. Returns the files written and
+# whether they came from the artifact cache.
+def generate_url_bundles(url, columns, overall_scores, output_dir, image_formats=()):
+    with instrumentation.run(url):
+        return _generate_url_bundles(url, columns, overall_scores, output_dir, image_formats)
+
+
+def _generate_url_bundles(url, columns, overall_scores, output_dir, image_formats):
+    dataset = _worker_data['dataset']
+    provider_ids_data = _worker_data['provider_ids_data']
+    features_matrix_data = _worker_data['features_matrix_data']
+    cache = _worker_data['cache']
+    url_columns = engine.list_columns(dataset, url)
+    provider_names = url_columns['provider_names']
+    headers_list = url_columns['columns']
+    overall_score_headers_list = url_columns['overall_scores']
+    if not provider_names:
+        raise ValueError("No data found for the given URL.")
+    selected_columns, selected_overall_scores = engine.resolve_selection(headers_list, overall_score_headers_list, columns, overall_scores)
+    if not selected_columns and not selected_overall_scores:
+        raise ValueError("None of the requested columns or overall scores exist for this URL.")
+
+    url_dir = os.path.join(output_dir, get_url_folder(url))
+    os.makedirs(url_dir, exist_ok=True)
+    written = []
+
+    bundle_key = None
+    if cache is not None:
+        bundle_key = engine.bundle_key(
+            dataset, url, selected_columns, selected_overall_scores, provider_ids_data, features_matrix_data, image_formats
+        )
+        cached_bundles = get_cached_bundles(cache, bundle_key)
+        if cached_bundles is not None:
+            for _, file_name, data in cached_bundles:
+                path = os.path.join(url_dir, file_name)
+                with open(path, 'wb') as f:
+                    f.write(data)
+                written.append(path)
+            return written, True
+
+    outputs = engine.build_outputs(
+        dataset, url, selected_columns, selected_overall_scores, overall_score_headers_list,
+        provider_ids_data, features_matrix_data, cache, image_formats=image_formats,
+        feature_pivots=_worker_data['feature_pivots']
+    )
+    bundle_specs = engine.bundle_specs(url, outputs)
+    for _, file_name, members in bundle_specs:
+        path = os.path.join(url_dir, file_name)
+        with open(path, 'wb') as f:
+            if cache is None:
+                with instrumentation.stage('bundles', rows=len(members)) as record:
+                    write_zip(f, members)  # Stream straight to disk
+                    record['bytes'] = f.tell()
+            else:
+                f.write(engine.bundle_data(cache, bundle_key, file_name, members))
+        written.append(path)
+    if cache is not None:
+        put_bundle_index(cache, bundle_key, bundle_specs)
+    return written, False
+
+
+# Function to load the worksheets from a local snapshot or from Google Sheets
+def load_worksheets(snapshot_dir=None, credentials=None, sheet_url=SHEET_URL):
+    if snapshot_dir:
+        backend = engine.open_backend(snapshot_dir=snapshot_dir)
+    elif credentials:
+        with open(credentials, encoding='utf-8') as f:
+            client = authorize_client(json.load(f))
+        # No time limit on queueing: a batch run would rather wait than fail
+        scheduler = QuotaScheduler(max_wait=float('inf'))
+        backend = engine.open_backend(scheduler.call(client.open_by_url, sheet_url), scheduler=scheduler)
+    else:
+        raise ValueError("Either a snapshot directory or a credentials file is required.")
+    return engine.load_snapshot(backend)
+
+
+# Generate bundles for every URL across a process pool. Progress and failures
+# are reported as each URL finishes. Returns {url: error message} for failures.
+def run_batch(worksheets, output_dir, columns=(), overall_scores=None, workers=None, urls=None,
+              cache_dir=None, cache_mb=512, image_formats=(), metrics_log=False, log=print):
+    dataset = engine.parse_dataset(worksheets['Consolidated'])
+    if urls is None:
+        urls = list(dataset.url_index)
+    columns = list(columns)
+    failures = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(dataset, worksheets['provider-ids'], worksheets['Features Matrix'], cache_dir, cache_mb, metrics_log),
+    ) as executor:
+        futures = {
+            executor.submit(generate_url_bundles, url, columns, overall_scores, output_dir, image_formats): url
+            for url in urls
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            url = futures[future]
+            try:
+                written, cached = future.result()
+            except Exception as exc:
+                failures[url] = str(exc)
+                log(f"[{done}/{len(urls)}] FAILED {url}: {exc}")
+            else:
+                log(f"[{done}/{len(urls)}] {'CACHED' if cached else 'OK'} {url} ({len(written)} files)")
+    log(f"Finished {len(urls)} URLs in {time.perf_counter() - start:.1f}s, {len(failures)} failed.")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate chart and table bundles for every URL in Consolidated.")
+    parser.add_argument('output_dir')
+    parser.add_argument('--snapshot-dir', help="Read the workbook from a local snapshot (see snapshot_store.py)")
+    parser.add_argument('--credentials', help="Path to a service account JSON file for reading Google Sheets")
+    parser.add_argument('--sheet-url', default=SHEET_URL)
+    parser.add_argument('--columns', nargs='*', default=[], help="Columns to include in the per-provider charts")
+    parser.add_argument('--overall-scores', nargs='*', default=None, help="Overall scores to export (default: all)")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument('--cache-dir', help="Artifact cache directory; unchanged URLs are not regenerated")
+    parser.add_argument('--cache-mb', type=int, default=512, help="Maximum artifact cache size in MB")
+    parser.add_argument('--images', nargs='*', default=[], choices=IMAGE_FORMATS,
+                        help="Also render static chart images in these formats (PNG needs the cairo library)")
+    parser.add_argument('--metrics-log', action='store_true', help="Log stage timings per URL as JSON lines on stderr")
+    args = parser.parse_args()
+
+    if not args.snapshot_dir and not args.credentials:
+        parser.error("one of --snapshot-dir or --credentials is required")
+    if 'png' in args.images and not png_available():
+        parser.error("--images png needs the cairo library (cairosvg); install it or use --images svg")
+
+    worksheets = load_worksheets(args.snapshot_dir, args.credentials, args.sheet_url)
+    failures = run_batch(
+        worksheets, args.output_dir, args.columns, args.overall_scores, args.workers,
+        cache_dir=args.cache_dir, cache_mb=args.cache_mb, image_formats=tuple(args.images),
+        metrics_log=args.metrics_log
+    )
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+# Benchmark suite for the data pipeline, run against synthetic workbooks.
+#
+# For each size the workbook is generated (untimed), then:
+#   parse      engine.parse_dataset() over the whole Consolidated sheet
+#   feature_pivots  the Features Matrix pivoted by category (once per snapshot)
+#   per URL    engine.build_outputs() plus the ZIP bundles for a sample of URLs,
+#              timed per stage by the instrumentation module: extract,
+#              master_table, provider_charts, overall_charts, overall_tables,
+#              chart_images (SVG), features_matrix and bundles
+# Memory is measured with tracemalloc, separately from the timings: the bytes
+# still allocated for the worksheets loaded from a snapshot (and the size of
+# their pickle, which is what st.cache_data keeps), the parsed dataset and a
+# SyncState after one sync, once everything else built along the way has been
+# freed.
+# Every timing is the best of --repeat runs. Results are appended as JSON
+# lines to benchmarks/results.jsonl with the commit and machine, and each run
+# is compared with the previous result for the same size, so regressions show
+# up as numbers.
+#
+# Usage:
+#   python benchmarks/bench.py                       # tiny, small, medium
+#   python benchmarks/bench.py --sizes large xlarge --sample-urls 20
+#   python benchmarks/bench.py --no-save             # print only
+
+import argparse
+import gc
+import json
+import os
+import pickle
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+import engine  # noqa: E402
+import instrumentation  # noqa: E402
+from consolidated import header_layout  # noqa: E402
+from snapshot_store import write_snapshot  # noqa: E402
+from sync import SyncState  # noqa: E402
+from synthetic import generate_workbook, workbook_urls  # noqa: E402
+
+RESULTS_FILE = os.path.join(BENCHMARK_DIR, 'results.jsonl')
+
+# Workbook sizes: roughly blocks * urls_per_block * providers_per_url Consolidated rows
+SIZES = {
+    'tiny': {'blocks': 5, 'urls_per_block': 2, 'providers_per_url': 5},            # ~50 rows
+    'small': {'blocks': 40, 'urls_per_block': 3, 'providers_per_url': 8},          # ~1k rows
+    'medium': {'blocks': 400, 'urls_per_block': 3, 'providers_per_url': 8},        # ~10k rows
+    'large': {'blocks': 4000, 'urls_per_block': 3, 'providers_per_url': 8},        # ~100k rows
+    'xlarge': {'blocks': 12000, 'urls_per_block': 3, 'providers_per_url': 8},      # ~300k rows
+}
+DEFAULT_SIZES = ['tiny', 'small', 'medium']
+
+
+# Function to get the current commit, if running from a git checkout
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Function to time fn() and return the best wall time of repeat runs
+def best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+# Function to get build()'s result and the bytes it keeps allocated, once
+# everything else allocated along the way has been freed
+def retained_bytes(build):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+# Measure the memory held by the workbook as loaded from a snapshot (as
+# objects, and pickled as st.cache_data stores it), the parsed dataset and a
+# synced SyncState
+def measure_memory(size, seed=0):
+    with tempfile.TemporaryDirectory() as directory:
+        write_snapshot(directory, generate_workbook(seed=seed, **SIZES[size]), 'benchmark')
+        backend = engine.open_backend(snapshot_dir=directory)
+
+        def load():
+            header_layout.cache_clear()  # The shared header layouts count towards what is measured
+            return engine.load_snapshot(backend)
+
+        def sync_state():
+            state = SyncState()
+            state.apply(load(), 'benchmark')
+            return state
+
+        memory = {}
+        snapshot, memory['snapshot_rows'] = retained_bytes(load)
+        memory['snapshot_pickle'] = len(pickle.dumps(snapshot))
+        del snapshot
+        _, memory['dataset'] = retained_bytes(lambda: engine.parse_dataset(load()['Consolidated']))
+        _, memory['sync_state'] = retained_bytes(sync_state)
+    return memory
+
+
+# Build every output and bundle for the sample URLs and sum the seconds per stage
+def time_url_stages(dataset, workbook, urls, feature_pivots):
+    totals = {}
+    with instrumentation.run('benchmark') as metrics:
+        for url in urls:
+            columns = engine.list_columns(dataset, url)
+            outputs = engine.build_outputs(
+                dataset, url, columns['columns'][:6], columns['overall_scores'], columns['overall_scores'],
+                workbook['provider-ids'], workbook['Features Matrix'], image_formats=('svg',),
+                feature_pivots=feature_pivots
+            )
+            engine.build_bundles(url, outputs)
+    for record in metrics.stages:
+        totals[record['stage']] = totals.get(record['stage'], 0.0) + record['seconds']
+    return totals
+
+
+# Run the benchmarks for one size and return the result record
+def run_size(size, sample_urls, repeat, seed=0):
+    memory = measure_memory(size, seed)
+    workbook = generate_workbook(seed=seed, **SIZES[size])
+    rows = workbook['Consolidated']
+    stages = {
+        'parse': best_time(lambda: engine.parse_dataset(rows), repeat),
+        'feature_pivots': best_time(lambda: engine.build_feature_pivots(workbook['Features Matrix']), repeat),
+    }
+
+    dataset = engine.parse_dataset(rows)
+    urls = workbook_urls(workbook)
+    step = max(1, len(urls) // sample_urls)
+    sample = urls[::step][:sample_urls]
+    best_url_stages = {}
+    for _ in range(repeat):
+        # Fresh pivots per run, so memoized provider sets only help within a run, as within a snapshot
+        feature_pivots = engine.build_feature_pivots(workbook['Features Matrix'])
+        for stage_name, seconds in time_url_stages(dataset, workbook, sample, feature_pivots).items():
+            best_url_stages[stage_name] = min(seconds, best_url_stages.get(stage_name, seconds))
+    # Per-URL stages are reported per URL so sizes can be compared directly
+    stages.update({f"{stage_name}_per_url": seconds / len(sample) for stage_name, seconds in best_url_stages.items()})
+
+    return {
+        'timestamp': time.time(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'size': size,
+        'rows': len(rows),
+        'urls': len(urls),
+        'sampled_urls': len(sample),
+        'repeat': repeat,
+        'stages': {stage_name: round(seconds, 6) for stage_name, seconds in stages.items()},
+        'memory': memory,
+    }
+
+
+# Function to load earlier results, oldest first
+def load_results(path=RESULTS_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# Function to print a result next to the previous one for the same size
+def print_result(result, previous=None):
+    print(f"\n{result['size']}: {result['rows']} rows, {result['urls']} URLs ({result['sampled_urls']} sampled)")
+    for stage_name, seconds in result['stages'].items():
+        line = f"  {stage_name:<28} {seconds * 1000:>10.2f} ms"
+        if previous and stage_name in previous['stages'] and previous['stages'][stage_name] > 0:
+            change = (seconds / previous['stages'][stage_name] - 1) * 100
+            line += f"  {change:+6.1f}% vs {previous.get('commit') or 'previous'}"
+        print(line)
+    for name, size in result.get('memory', {}).items():
+        line = f"  {name + ' memory':<28} {size / 1024 / 1024:>10.2f} MB"
+        previous_size = (previous or {}).get('memory', {}).get(name)
+        if previous_size:
+            line += f"  {(size / previous_size - 1) * 100:+6.1f}% vs {previous.get('commit') or 'previous'}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic workbooks.")
+    parser.add_argument('--sizes', nargs='*', default=DEFAULT_SIZES, choices=list(SIZES))
+    parser.add_argument('--sample-urls', type=int, default=25, help="URLs to build outputs for per size")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement; the best is kept")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--results', default=RESULTS_FILE, help="JSON lines file the results are appended to")
+    parser.add_argument('--no-save', action='store_true', help="Do not append the results")
+    args = parser.parse_args()
+
+    history = load_results(args.results)
+    for size in args.sizes:
+        result = run_size(size, args.sample_urls, args.repeat, args.seed)
+        previous = next((entry for entry in reversed(history) if entry['size'] == size), None)
+        print_result(result, previous)
+        if not args.no_save:
+            with open(args.results, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+# Synthetic workbook generator for benchmarks and offline runs.
+#
+# Builds the three worksheets the app reads, shaped like the live workbook:
+# Consolidated is a stack of 'Sheet: <article>' rows, 'URL' header rows and
+# provider rows (with blank separators, some empty or text score cells and
+# URLs that appear in more than one block), provider-ids maps names to IDs
+# (with a few providers missing), and Features Matrix has one column per
+# provider. Output is deterministic for a given seed.
+#
+# Usage:
+#   python benchmarks/synthetic.py <snapshot_dir> --blocks 200 --urls-per-block 5
+# writes a local snapshot that brand.py (BRAND_SNAPSHOT_DIR) and batch.py
+# (--snapshot-dir) can read.
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snapshot_store import write_snapshot  # noqa: E402
+
+KNOWN_PROVIDERS = [
+    'NordVPN', 'Surfshark', 'ExpressVPN', 'IPVanish', 'CyberGhost', 'PureVPN',
+    'ProtonVPN', 'PrivateVPN', 'PIA', 'Hotspot Shield', 'StrongVPN',
+]
+
+SPEED_REGIONS = ['UK', 'US', 'Germany', 'Japan', 'Australia', 'Brazil', 'Canada', 'India']
+SPEED_METRICS = ['Download', 'Upload', 'Latency']
+SCORE_CATEGORIES = ['Ease of Use', 'Security & Privacy', 'Streaming Ability', 'UK Speed', 'Value for Money']
+FEATURE_CATEGORIES = {
+    'Security': ['Kill switch', 'AES-256', 'No-logs audit', 'RAM-only servers', 'Leak protection'],
+    'Streaming': ['Netflix US', 'BBC iPlayer', 'Disney+', 'Hulu'],
+    'Usability': ['Simultaneous connections', 'Split tunneling', 'Router app', 'Browser extension'],
+    'Support': ['Live chat', 'Money-back guarantee'],
+}
+ARTICLE_TOPICS = ['How to watch', 'Best VPN for', 'How to unblock', 'Best free VPN for', 'How to stream']
+ARTICLE_SUBJECTS = ['Netflix', 'the Premier League', 'gaming', 'torrenting', 'China', 'BBC iPlayer', 'Kodi', 'Firestick']
+
+
+# Function to get n provider names, the known ones first
+def provider_pool(count):
+    return (KNOWN_PROVIDERS + [f"Provider {index}" for index in range(count)])[:count]
+
+
+# Function to get n score column headers: speed tests first, then overall scores
+def score_headers(count, rng):
+    speed = [f"{region} Speed: {metric}" for region in SPEED_REGIONS for metric in SPEED_METRICS]
+    overall = [f"{category}: Overall Score" for category in SCORE_CATEGORIES] + ['Overall Score', 'Average Score']
+    overall_count = min(len(overall), max(1, count // 3))
+    speed_count = count - overall_count
+    speed = (speed + [f"Extra Test {index}" for index in range(speed_count)])[:speed_count]
+    return rng.sample(speed, len(speed)) + overall[:overall_count]
+
+
+# Function to produce one score cell: mostly numbers, sometimes blank or text
+def score_cell(header, rng):
+    roll = rng.random()
+    if roll < 0.04:
+        return ''
+    if roll < 0.05:
+        return 'N/A'
+    if 'Overall Score' in header or 'Average' in header:
+        return f"{rng.uniform(4, 10):.2f}"
+    if header.endswith('Latency'):
+        return f"{rng.uniform(5, 300):.1f}"
+    return f"{rng.uniform(0.5, 950):.3f}"
+
+
+# Generate a workbook as {title: rows}. Consolidated has about
+# blocks * urls_per_block * providers_per_url provider rows.
+def generate_workbook(blocks=50, urls_per_block=3, providers=12, providers_per_url=8, columns=14,
+                      shared_url_rate=0.05, seed=0):
+    rng = random.Random(seed)
+    provider_names = provider_pool(providers)
+    providers_per_url = min(providers_per_url, providers)
+
+    consolidated = []
+    all_urls = []
+    for block_index in range(blocks):
+        headers = ['URL', 'VPN provider'] + score_headers(columns, rng)
+        topic = rng.choice(ARTICLE_TOPICS)
+        subject = rng.choice(ARTICLE_SUBJECTS)
+        consolidated.append([f"Sheet: {topic} {subject} {block_index}"])
+        consolidated.append(headers)
+        for url_index in range(urls_per_block):
+            if all_urls and rng.random() < shared_url_rate:
+                url = rng.choice(all_urls)  # The same article tested in another block
+            else:
+                url = f"https://www.example.com/blog/vpn/{topic.lower().replace(' ', '-')}-{block_index}-{url_index}/"
+                all_urls.append(url)
+            for provider_name in rng.sample(provider_names, providers_per_url):
+                consolidated.append([url, provider_name] + [score_cell(header, rng) for header in headers[2:]])
+        consolidated.append([])
+
+    # A few providers have no ID, which the master table reports as missing
+    provider_ids = [['Provider', 'ID']]
+    for index, provider_name in enumerate(provider_names):
+        if rng.random() > 0.1:
+            provider_ids.append([provider_name, str(1000 + index)])
+
+    features_matrix = [['Category', 'Feature'] + provider_names]
+    for category, features in FEATURE_CATEGORIES.items():
+        for feature in features:
+            features_matrix.append([category, feature] + [rng.choice(['Yes', 'No', 'Partial']) for _ in provider_names])
+
+    width = max(len(row) for row in consolidated)
+    return {
+        'Consolidated': [row + [''] * (width - len(row)) for row in consolidated],
+        'provider-ids': provider_ids,
+        'Features Matrix': features_matrix,
+    }
+
+
+# Function to list the URLs of a generated workbook, in sheet order
+def workbook_urls(workbook):
+    seen = {}
+    for row in workbook['Consolidated']:
+        if len(row) >= 2 and row[0].startswith('http') and row[1]:
+            seen.setdefault(row[0], None)
+    return list(seen)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic workbook as a local snapshot.")
+    parser.add_argument('directory')
+    parser.add_argument('--blocks', type=int, default=50)
+    parser.add_argument('--urls-per-block', type=int, default=3)
+    parser.add_argument('--providers', type=int, default=12)
+    parser.add_argument('--providers-per-url', type=int, default=8)
+    parser.add_argument('--columns', type=int, default=14)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    workbook = generate_workbook(
+        args.blocks, args.urls_per_block, args.providers, args.providers_per_url, args.columns, seed=args.seed
+    )
+    write_snapshot(args.directory, workbook, f"synthetic-{args.seed}")
+    print(f"Wrote {len(workbook['Consolidated'])} Consolidated rows, {len(workbook_urls(workbook))} URLs to {args.directory}")
+
+
+if __name__ == '__main__':
+    main()
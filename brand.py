@@ -1,821 +1,530 @@
 import streamlit as st
-import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+import cProfile
 import io
-import zipfile
-import json
-import uuid  # For generating unique IDs
-import re
+import marshal
 import os
-
-# Step 1: Set up Google Sheets access
-credentials_info = st.secrets["gsheet_service_account"]
-scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-creds = Credentials.from_service_account_info(credentials_info, scopes=scope)
-
-# Authorize client
-client = gspread.authorize(creds)
-
-# Function to make titles more natural
-def make_title_natural(article_name):
-    article_name = article_name.strip()
-    if article_name.lower().startswith('how to'):
-        # Remove 'How to' and convert the next verb to gerund form
-        rest = article_name[6:].strip()  # Remove 'How to'
-        # Convert first word to gerund
-        words = rest.split()
-        if words:
-            first_word = words[0]
-            # Simple way to convert to gerund by adding 'ing'
-            if not first_word.endswith('ing'):
-                if first_word.endswith('e'):
-                    first_word = first_word[:-1] + 'ing'
-                else:
-                    first_word = first_word + 'ing'
-            words[0] = first_word
-            rest = ' '.join(words)
-        return rest
-    elif article_name.lower().startswith('best '):
-        return article_name  # Keep as is
-    else:
-        return article_name
-
-# Function to sanitize filenames
-def sanitize_filename(filename):
-    return re.sub(r'[^A-Za-z0-9_\-\.]', '_', filename)
-
-# Prompt the user for a URL
-st.write("Enter the URL to find the corresponding VPN data:")
-input_url = st.text_input("URL", "")
-
-if input_url:
-    # Load the Google Sheet after URL is entered
-    sheet1_url = 'https://docs.google.com/spreadsheets/d/1ZhJhTJSzrdM2c7EoWioMkzWpONJNyalFmWQDSue577Q'
-    sheet1 = client.open_by_url(sheet1_url)
-    consolidated_sheet = sheet1.worksheet('Consolidated')
-    consolidated_data = consolidated_sheet.get_all_values()
-
-    # Process the data to collect headers and provider names
-    provider_names = []
-    overall_scores_data = {}
-    processed_providers = set()
-    speed_test_data_per_provider = {}
-    matching_headers = set()
-    overall_score_headers = set()
-    i = 0
-    while i < len(consolidated_data):
-        row = consolidated_data[i]
-        # Check if the row is a header row starting with 'URL'
-        if row and row[0] and row[0].strip().lower() == 'url':
-            # Extract the article name from the previous row
-            if i > 0:
-                previous_row = consolidated_data[i - 1]
-                if previous_row and previous_row[0].startswith('Sheet:'):
-                    raw_article_name = previous_row[0].replace('Sheet:', '').strip()
-                    article_name = make_title_natural(raw_article_name)
-                else:
-                    article_name = 'VPN Analysis'
-            else:
-                article_name = 'VPN Analysis'
-
-            headers_row = row
-            i += 1  # Move to the next row after the header
-
-            # Define terms that are considered overall scores
-            overall_score_terms = ['overall score', 'average']
-
-            # Process the data rows until the next header or end of data
-            while i < len(consolidated_data):
-                provider_row = consolidated_data[i]
-                # Check if we've reached the next header row
-                if provider_row and provider_row[0] and provider_row[0].strip().lower() == 'url':
-                    break  # Next header row found, break to process the new dataset
-
-                # Skip empty rows or rows without URLs or VPN Provider
-                if not provider_row or len(provider_row) < 2 or not provider_row[0] or not provider_row[1]:
-                    i += 1
-                    continue
-
-                url = provider_row[0].strip()
-                provider_name = provider_row[1].strip()
-
-                # Only process the rows where the URL matches the input
-                if input_url.strip() != url.strip():
-                    i += 1
-                    continue  # Skip rows where the URL doesn't match the user input
-
-                # Collect headers
-                matching_headers.update(headers_row)
-
-                # Collect overall score headers
-                matched_overall_columns = [header for header in headers_row if header and any(term in header.lower() for term in overall_score_terms)]
-                overall_score_headers.update(matched_overall_columns)
-
-                # Use a combination of URL and provider name to ensure uniqueness across datasets
-                unique_provider_key = f"{url}_{provider_name}"
-                if unique_provider_key not in processed_providers:
-                    processed_providers.add(unique_provider_key)
-                    if provider_name not in provider_names:
-                        provider_names.append(provider_name)  # Add provider name once
-
-                    # Initialize overall_scores_data for new columns
-                    for header in matched_overall_columns:
-                        if header not in overall_scores_data:
-                            overall_scores_data[header] = {}
-
-                    # Extract overall score data for the provider
-                    for col in matched_overall_columns:
-                        try:
-                            col_index = headers_row.index(col)
-                            score = provider_row[col_index]
-                            if score:
-                                score_value = float(score)  # Convert to float
-                            else:
-                                score_value = 0
-                        except (ValueError, IndexError):
-                            score_value = 0  # Handle errors by assigning a default value
-
-                        # Round overall scores to 1 decimal place
-                        score_value = round(score_value, 1)
-
-                        overall_scores_data[col].setdefault('article_name', article_name)
-                        overall_scores_data[col][provider_name] = score_value
-
-                    # Store the article name associated with this provider
-                    speed_test_data_per_provider[provider_name] = {'article_name': article_name}
-
-                i += 1  # Move to next provider row
-            # End of current dataset
-            continue  # Go back to look for the next header row
-        else:
-            i += 1  # Move to next row
-
-    if not provider_names:
-        st.write("No data found for the given URL.")
-    else:
-        # We have collected the matching headers
-        headers_list = list(matching_headers)
-        # Remove 'URL' and 'VPN provider' from headers
-        headers_list = [header for header in headers_list if header not in ['URL', 'VPN provider']]
-        # Sort headers for better presentation
-        headers_list.sort()
-
-        # Now present the headers to the user for selection
-        st.write("Select the columns you want to include in the per-provider charts:")
-        selected_columns = st.multiselect("Available columns", headers_list)
-
-        # Allow the user to select which overall scores to export
-        overall_score_headers_list = list(overall_score_headers)
-        overall_score_headers_list.sort()
-        st.write("Select the overall scores you want to export to charts:")
-        selected_overall_scores = st.multiselect("Available overall scores", overall_score_headers_list, default=overall_score_headers_list)
+import pstats
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import engine
+from artifact_cache import ArtifactCache
+from artifacts import MASTER_TABLE_FILE, MASTER_TABLE_WITH_IDS_FILE
+from consolidated import normalize_url
+from instrumentation import configure_json_logging, count_rows, ensure_run, run, stage
+from quota import QuotaScheduler
+from sheets import SHEET_URL, SNAPSHOT_WORKSHEETS, authorize_client
+from singleflight import SingleFlight
+from static_charts import png_available
+from sync import SyncState
+
+# Run against a local snapshot (see snapshot_store.py) instead of live Google Sheets
+SNAPSHOT_DIR = os.environ.get('BRAND_SNAPSHOT_DIR')
+
+# How long (seconds) a cached snapshot may be served before it is re-downloaded,
+# and how often we ask Google for the spreadsheet's last modified time
+SNAPSHOT_TTL = int(os.environ.get('BRAND_SNAPSHOT_TTL', '600'))
+REVISION_CHECK_TTL = int(os.environ.get('BRAND_REVISION_CHECK_TTL', '30'))
+
+# Range-restricted fetch: instead of the whole Consolidated sheet, read its
+# column A once per revision and then only the datasets containing the URL
+RANGE_FETCH = os.environ.get('BRAND_RANGE_FETCH', '') == '1'
+
+# On-disk cache for generated charts and ZIP bundles
+ARTIFACT_CACHE_DIR = os.environ.get('BRAND_ARTIFACT_CACHE_DIR', os.path.expanduser('~/.cache/brand/artifacts'))
+ARTIFACT_CACHE_MB = int(os.environ.get('BRAND_ARTIFACT_CACHE_MB', '512'))
+
+# Sheets API request budget per minute, and how long (seconds) a call may queue
+# for a free slot before the last good data is served instead
+SHEETS_REQUESTS_PER_MINUTE = int(os.environ.get('BRAND_SHEETS_RPM', '60'))
+SHEETS_MAX_WAIT = float(os.environ.get('BRAND_SHEETS_MAX_WAIT', '15'))
+
+# Local snapshot served when Google Sheets is out of quota and nothing was fetched yet
+FALLBACK_SNAPSHOT_DIR = os.environ.get('BRAND_FALLBACK_SNAPSHOT_DIR')
+
+# Emit one JSON line per rerun with the stage timings (to stderr)
+METRICS_LOG = os.environ.get('BRAND_METRICS_LOG', '') == '1'
+
+# Worker processes used to render static chart images
+RENDER_WORKERS = int(os.environ.get('BRAND_RENDER_WORKERS', '2'))
+
+# Worker processes used to build the URLs of a comparison (1 builds them in the page's thread)
+COMPARE_WORKERS = int(os.environ.get('BRAND_COMPARE_WORKERS', str(os.cpu_count() or 1)))
+
+# Step 1: Set up Google Sheets access. The client is authorized lazily, the first
+# time data is needed, and shared by all sessions in this process so they reuse its
+# HTTP session and connection pool. Its credentials refresh when the token expires.
+@st.cache_resource(show_spinner=False)
+def get_client():
+    return authorize_client(st.secrets["gsheet_service_account"])
+
+# Concurrent sessions building the same URL outputs or comparison share one
+# in-flight computation. The Sheets calls, sync and parsing run inside
+# st.cache_* functions, which already let only one caller per key compute.
+@st.cache_resource(show_spinner=False)
+def get_flights():
+    return SingleFlight()
+
+# All Sheets calls share one per-minute budget, with backoff on 429s
+@st.cache_resource(show_spinner=False)
+def get_scheduler():
+    return QuotaScheduler(SHEETS_REQUESTS_PER_MINUTE, max_wait=SHEETS_MAX_WAIT)
+
+# The backend is shared by all sessions. The spreadsheet is opened once per
+# process (one metadata lookup), on the first call: that goes through the
+# request budget like any other call, so when it runs out of quota the page is
+# served from the fallback snapshot and the open is tried again later.
+@st.cache_resource(show_spinner=False)
+def get_backend(sheet_url):
+    if SNAPSHOT_DIR:
+        return engine.open_backend(snapshot_dir=SNAPSHOT_DIR)
+    return engine.open_backend(
+        open_spreadsheet=lambda: get_client().open_by_url(sheet_url), scheduler=get_scheduler(),
+        fallback_dir=FALLBACK_SNAPSHOT_DIR
+    )
+
+# Function to get the spreadsheet's revision (its last modified time)
+@st.cache_data(ttl=REVISION_CHECK_TTL, show_spinner=False)
+def get_sheet_revision(sheet_url):
+    return get_backend(sheet_url).get_revision()
+
+# Function to load a snapshot of all worksheets we use. The revision is part of
+# the cache key, so an edit to the spreadsheet invalidates the cached snapshot.
+# The loaded rows are shared by all sessions as they are (not copied and
+# unpickled on every rerun), so they must be treated as read-only.
+@st.cache_resource(ttl=SNAPSHOT_TTL, max_entries=2, show_spinner="Loading data from Google Sheets...")
+def load_snapshot(sheet_url, revision, titles=tuple(SNAPSHOT_WORKSHEETS)):
+    return engine.load_snapshot(get_backend(sheet_url), titles)
+
+# Function to load column A of Consolidated, the index for range-restricted fetches
+@st.cache_resource(ttl=SNAPSHOT_TTL, max_entries=2, show_spinner=False)
+def load_column_index(sheet_url, revision):
+    return engine.load_column_index(get_backend(sheet_url))
+
+# Function to load only the Consolidated rows of the datasets containing a URL
+@st.cache_resource(ttl=SNAPSHOT_TTL, max_entries=256, show_spinner="Loading data from Google Sheets...")
+def load_url_rows(sheet_url, revision, url):
+    return engine.load_url_rows(get_backend(sheet_url), load_column_index(sheet_url, revision), url)
+
+# The last synced workbook, shared by all sessions; new revisions are applied as deltas
+@st.cache_resource(show_spinner=False)
+def get_sync_state(sheet_url):
+    return SyncState()
+
+# Sync each full snapshot once and share the result across sessions. The delta
+# sync re-parses only the blocks edited since the last revision and tells which
+# URLs' inputs changed.
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_sync_delta(sheet_url, revision, _snapshot):
+    return engine.sync_snapshot(get_sync_state(sheet_url), _snapshot, revision)
+
+# Function to get the parsed dataset of a full snapshot
+def get_dataset(sheet_url, revision, snapshot):
+    return get_sync_delta(sheet_url, revision, snapshot)['dataset']
+
+# Function to get the revision a URL's inputs last changed at; per-URL caches
+# keyed on it are kept when only other URLs are edited
+def get_url_revision(sheet_url, revision, snapshot, url):
+    return get_sync_delta(sheet_url, revision, snapshot)['url_revisions'].get(normalize_url(url), revision)
+
+# With range-restricted fetches the Consolidated rows only cover one URL; they
+# are parsed once per URL and revision
+@st.cache_resource(max_entries=64, show_spinner=False)
+def get_url_dataset(sheet_url, revision, url, _consolidated_data):
+    return engine.parse_dataset(_consolidated_data)
+
+# The artifact cache is shared by all sessions in this process
+@st.cache_resource(show_spinner=False)
+def get_artifact_cache():
+    return ArtifactCache(ARTIFACT_CACHE_DIR, ARTIFACT_CACHE_MB * 1024 * 1024)
+
+# The URL search index is built once per snapshot, from the parsed dataset or,
+# with range-restricted fetches, from column A of Consolidated
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_url_search(sheet_url, revision):
+    if RANGE_FETCH:
+        return engine.build_url_search(column_index=load_column_index(sheet_url, revision))
+    return engine.build_url_search(get_dataset(sheet_url, revision, load_snapshot(sheet_url, revision)))
+
+# The Features Matrix is pivoted by category once per snapshot
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_feature_pivots(sheet_url, revision, _features_matrix_data):
+    return engine.build_feature_pivots(_features_matrix_data)
+
+# The Features Matrix tables only depend on the URL's providers, so they are
+# built once per URL, whatever columns are selected, and kept until the URL's
+# own inputs change (url_revision)
+@st.cache_resource(max_entries=256, show_spinner=False)
+def get_feature_outputs(sheet_url, url_revision, url, _dataset, _features_matrix_data, _feature_pivots):
+    return engine.build_feature_outputs(_dataset, url, _features_matrix_data, _feature_pivots)
+
+# Static chart images are rendered in a process pool shared by all sessions
+@st.cache_resource(show_spinner=False)
+def get_render_pool():
+    return ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+
+# Comparisons are built in a process pool shared by all sessions
+@st.cache_resource(show_spinner=False)
+def get_compare_pool():
+    return ProcessPoolExecutor(max_workers=COMPARE_WORKERS) if COMPARE_WORKERS > 1 else None
+
+# Record stage timings for this rerun; optionally profile it
+if METRICS_LOG:
+    configure_json_logging()
+show_timings = st.sidebar.checkbox("Show stage timings")
+profiler = cProfile.Profile() if st.sidebar.checkbox("Profile this rerun (cProfile)") else None
+
+# Manual refresh drops the cached snapshot and revision
+if st.sidebar.button("Refresh data"):
+    load_snapshot.clear()
+    load_column_index.clear()
+    load_url_rows.clear()
+    get_sheet_revision.clear()
+
+# How many URL builds and comparisons were shared between sessions, and how
+# the Sheets request budget is holding up
+with st.sidebar.expander("Request coalescing"):
+    st.table(get_flights().metrics())
+if not SNAPSHOT_DIR:
+    with st.sidebar.expander("Sheets quota"):
+        st.table(get_scheduler().metrics())
+
+# Optionally add static SVG/PNG renders of every chart to the downloads
+render_images = st.sidebar.checkbox("Include static chart images (SVG/PNG)")
+image_formats = ()
+if render_images:
+    image_formats = ('svg', 'png') if png_available() else ('svg',)
+    if 'png' not in image_formats:
+        st.sidebar.caption("PNG export needs the cairo library; only SVGs will be included.")
+
+# Tables longer than this are shown a page at a time
+TABLE_PAGE_ROWS = int(os.environ.get('BRAND_TABLE_PAGE_ROWS', '200'))
+
+# Function to get the score columns of a table (all but 'VPN Provider')
+def score_columns(df):
+    return [col for col in df.columns if col != 'VPN Provider']
+
+# Show a table with its score columns formatted to two decimals by the grid
+# itself (no Styler), a page at a time once it is longer than TABLE_PAGE_ROWS.
+# A fragment, so turning a page reruns only the table.
+@st.fragment
+def show_table(df, key, numeric_columns=()):
+    with ensure_run('table'), stage('render', rows=len(df)):
+        if len(df) > TABLE_PAGE_ROWS:
+            page_count = -(-len(df) // TABLE_PAGE_ROWS)
+            page = st.number_input("Page", min_value=1, max_value=page_count, value=1, key=f"{key}_page")
+            start = (page - 1) * TABLE_PAGE_ROWS
+            st.caption(f"Rows {start + 1}-{min(start + TABLE_PAGE_ROWS, len(df))} of {len(df)}")
+            df = df.iloc[start:start + TABLE_PAGE_ROWS]
+        column_config = {col: st.column_config.NumberColumn(format="%.2f") for col in numeric_columns}
+        st.dataframe(df, column_config=column_config)
+
+# Column and overall score selection and everything built from it. This runs
+# as a fragment: submitting the form reruns only this section, and the form
+# batches the selections so picking several columns costs one rerun.
+@st.fragment
+def selections_section(dataset, url, url_columns, snapshot, feature_outputs, image_formats):
+    with ensure_run('selections'):
+        with st.form('selections'):
+            # Now present the headers to the user for selection
+            st.write("Select the columns you want to include in the per-provider charts:")
+            selected_columns = st.multiselect("Available columns", url_columns['columns'])
+
+            # Allow the user to select which overall scores to export
+            st.write("Select the overall scores you want to export to charts:")
+            overall_score_headers_list = url_columns['overall_scores']
+            selected_overall_scores = st.multiselect("Available overall scores", overall_score_headers_list, default=overall_score_headers_list)
+            st.form_submit_button("Update charts and tables")
 
         # Now, if the user has selected columns or overall scores, process the data to generate the charts
-        if selected_columns or selected_overall_scores:
-            # Reset data structures
-            processed_providers = set()
-            provider_names = []
-            speed_test_data_per_provider = {}
-            overall_scores_data = {}
-
-            # Initialize lists for charts and tables
-            features_matrix_tables = []  # List of (filepath, dataframe)
-            overall_tables = []  # List of (filepath, dataframe)
-            provider_level_charts = []  # List of (filepath, content)
-            overall_charts = []  # List of (filepath, content)
-
-            i = 0
-            while i < len(consolidated_data):
-                row = consolidated_data[i]
-                # Check if the row is a header row starting with 'URL'
-                if row and row[0] and row[0].strip().lower() == 'url':
-                    # Extract the article name from the previous row
-                    if i > 0:
-                        previous_row = consolidated_data[i - 1]
-                        if previous_row and previous_row[0].startswith('Sheet:'):
-                            raw_article_name = previous_row[0].replace('Sheet:', '').strip()
-                            article_name = make_title_natural(raw_article_name)
-                        else:
-                            article_name = 'VPN Analysis'
-                    else:
-                        article_name = 'VPN Analysis'
-
-                    headers_row = row
-                    i += 1  # Move to the next row after the header
-
-                    # Define terms that are considered overall scores
-                    overall_score_terms = ['overall score', 'average']
-
-                    # Process the data rows until the next header or end of data
-                    while i < len(consolidated_data):
-                        provider_row = consolidated_data[i]
-                        # Check if we've reached the next header row
-                        if provider_row and provider_row[0] and provider_row[0].strip().lower() == 'url':
-                            break  # Next header row found, break to process the new dataset
-
-                        # Skip empty rows or rows without URLs or VPN Provider
-                        if not provider_row or len(provider_row) < 2 or not provider_row[0] or not provider_row[1]:
-                            i += 1
-                            continue
-
-                        url = provider_row[0].strip()
-                        provider_name = provider_row[1].strip()
-
-                        # Only process the rows where the URL matches the input
-                        if input_url.strip() != url.strip():
-                            i += 1
-                            continue  # Skip rows where the URL doesn't match the user input
-
-                        # Use a combination of URL and provider name to ensure uniqueness across datasets
-                        unique_provider_key = f"{url}_{provider_name}"
-                        if unique_provider_key not in processed_providers:
-                            processed_providers.add(unique_provider_key)
-                            if provider_name not in provider_names:
-                                provider_names.append(provider_name)  # Add provider name once
-
-                            # Extract data for selected columns for the provider
-                            provider_selected_data = []
-                            selected_labels = []
-                            for col in selected_columns:
-                                if col in headers_row:
-                                    col_index = headers_row.index(col)
-                                    value = provider_row[col_index]
-                                    try:
-                                        value = float(value)
-                                    except (ValueError, TypeError):
-                                        value = 0
-                                    # Round provider-level scores to 2 decimal places
-                                    value = round(value, 2)
-                                    provider_selected_data.append(value)
-                                    selected_labels.append(col)
-                                else:
-                                    # Column not in this dataset's headers
-                                    provider_selected_data.append(0)
-                                    selected_labels.append(col)
-
-                            # Store data for provider
-                            if provider_name not in speed_test_data_per_provider:
-                                speed_test_data_per_provider[provider_name] = {'data': {}, 'article_name': article_name}
-                            speed_test_data_per_provider[provider_name]['data'] = (selected_labels, provider_selected_data)
-
-                            # Extract overall score data for selected overall scores
-                            for col in overall_score_headers_list:
-                                if col in headers_row:
-                                    col_index = headers_row.index(col)
-                                    score = provider_row[col_index]
-                                    try:
-                                        score_value = float(score)
-                                    except (ValueError, TypeError):
-                                        score_value = 0
-                                else:
-                                    score_value = 0
-
-                                # Round overall scores to 1 decimal place
-                                score_value = round(score_value, 1)
-
-                                if col not in overall_scores_data:
-                                    overall_scores_data[col] = {}
-                                    overall_scores_data[col]['article_name'] = article_name
-                                overall_scores_data[col][provider_name] = score_value
-
-                        i += 1  # Move to next provider row
-                    # End of current dataset
-                    continue  # Go back to look for the next header row
-                else:
-                    i += 1  # Move to next row
-
-            # Load the 'provider-ids' sheet and create a mapping
-            provider_ids_sheet = sheet1.worksheet('provider-ids')
-            provider_ids_data = provider_ids_sheet.get_all_values()
-
-            # Create a mapping from provider names to IDs
-            provider_id_mapping = {}
-            for row in provider_ids_data[1:]:  # Skip header row
-                if len(row) >= 2:
-                    provider_name_map = row[0].strip()
-                    provider_id = row[1].strip()
-                    provider_id_mapping[provider_name_map] = provider_id
-
-            # Exclude 'Average' from master table overall scores
-            master_overall_score_headers_list = [header for header in overall_score_headers_list if 'average' not in header.lower()]
-
-            # Generate and display master table
-            master_table_data = []
-            if master_overall_score_headers_list:
-                for provider_name in provider_names:
-                    provider_entry = {'VPN Provider': provider_name}
-                    for score_type in master_overall_score_headers_list:
-                        score_value = overall_scores_data.get(score_type, {}).get(provider_name, 0)
-                        provider_entry[score_type] = score_value
-                    master_table_data.append(provider_entry)
-
-                # Create DataFrame
-                master_df = pd.DataFrame(master_table_data)
-
-                # Convert numeric columns to floats
-                numeric_columns = master_df.columns.drop('VPN Provider')
-                master_df[numeric_columns] = master_df[numeric_columns].apply(pd.to_numeric, errors='coerce')
-
-                # Sort by 'Overall Score' if it exists
-                if 'Overall Score' in master_df.columns:
-                    master_df = master_df.sort_values(by='Overall Score', ascending=False)
-                else:
-                    # If 'Overall Score' is not present, sort by the first overall score column
-                    first_score_column = [col for col in master_df.columns if col != 'VPN Provider'][0]
-                    master_df = master_df.sort_values(by=first_score_column, ascending=False)
-                master_df.reset_index(drop=True, inplace=True)
-
-                # Remove 'Overall Score' column from displayed table
-                if 'Overall Score' in master_df.columns:
-                    master_df_display = master_df.drop(columns=['Overall Score'])
-                else:
-                    master_df_display = master_df.copy()
-
-                # Reorder columns as specified
-                desired_columns = [
-                    'VPN Provider',
-                    'Ease of Use: Overall Score',
-                    'Security & Privacy: Overall Score',
-                    'Streaming Ability: Overall Score',
-                    'UK Speed: Overall Score',
-                    'Value for Money: Overall Score'
-                ]
-                # Keep only the columns that are present in master_df_display
-                columns_to_display = [col for col in desired_columns if col in master_df_display.columns]
-                master_df_display = master_df_display[columns_to_display]
-
-                # Round numerical columns to two decimal places for display
-                numeric_columns_display = [col for col in master_df_display.columns if col != 'VPN Provider']
-                master_df_display[numeric_columns_display] = master_df_display[numeric_columns_display].apply(pd.to_numeric, errors='coerce')
-
-                # Apply formatting using Styler
-                format_dict = {col: "{:.2f}" for col in numeric_columns_display}
-                master_df_display = master_df_display.style.format(format_dict)
-
-                # Display the master table first using st.dataframe()
-                st.write("## Master Overall Scores Table")
-                st.dataframe(master_df_display)
-
-                # Provide download button for master table with provider names
-                csv = master_df.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label="Download Master Table as CSV",
-                    data=csv,
-                    file_name='master_overall_scores.csv',
-                    mime='text/csv'
-                )
-
-                # Add to overall_tables
-                overall_tables.append(('Overall Tables/master_overall_scores.csv', master_df))
-
-                # Create a copy of master_df and replace 'VPN Provider' with IDs
-                master_df_with_ids = master_df.copy()
-                mapped_ids = master_df_with_ids['VPN Provider'].map(provider_id_mapping)
-
-                # Identify providers not found in mapping
-                missing_providers = master_df_with_ids.loc[mapped_ids.isna(), 'VPN Provider'].unique()
-                if len(missing_providers) > 0:
-                    st.write("Warning: The following provider names were not found in the provider ID mapping:")
-                    st.write(missing_providers)
-
-                # Replace 'VPN Provider' column with mapped IDs
-                master_df_with_ids['VPN Provider'] = mapped_ids
-
-                # Optionally, fill NaNs with 'Unknown' or keep the names
-                master_df_with_ids['VPN Provider'].fillna('Unknown', inplace=True)
-
-                # Rename 'VPN Provider' column to 'ID'
-                master_df_with_ids.rename(columns={'VPN Provider': 'ID'}, inplace=True)
+        if not (selected_columns or selected_overall_scores):
+            st.write("Please select at least one column or overall score to generate charts.")
+            return
+
+        artifact_cache = get_artifact_cache()
+        outputs = get_flights().do(
+            'outputs', (id(dataset), normalize_url(url), tuple(selected_columns), tuple(selected_overall_scores), image_formats),
+            engine.build_outputs,
+            dataset, url, selected_columns, selected_overall_scores, overall_score_headers_list,
+            snapshot['provider-ids'], snapshot['Features Matrix'], artifact_cache,
+            image_formats=image_formats, executor=get_render_pool() if image_formats else None,
+            feature_outputs=feature_outputs
+        )
+
+        # Every table is serialized once; download buttons reuse those bytes
+        table_files = dict(outputs['table_files'])
+
+        # Display the master table first
+        master_tables = outputs['master_tables']
+        if master_tables is not None:
+            master_df_display = master_tables['display_table']
+            st.write("## Master Overall Scores Table")
+            show_table(master_df_display, 'master', score_columns(master_df_display))
+
+            # Provide download button for master table with provider names
+            st.download_button(
+                label="Download Master Table as CSV",
+                data=table_files[MASTER_TABLE_FILE],
+                file_name='master_overall_scores.csv',
+                mime='text/csv',
+                on_click='ignore'
+            )
+
+            missing_providers = master_tables['missing_providers']
+            if len(missing_providers) > 0:
+                st.write("Warning: The following provider names were not found in the provider ID mapping:")
+                st.write(missing_providers)
+
+            # Provide download button for master table with IDs
+            st.download_button(
+                label="Download Master Table with IDs as CSV",
+                data=table_files[MASTER_TABLE_WITH_IDS_FILE],
+                file_name='master_overall_scores_with_ids.csv',
+                mime='text/csv',
+                on_click='ignore'
+            )
+        else:
+            st.write("No overall scores (excluding 'Average') selected for the master table.")
 
-                # Remove 'Overall Score' column if it exists
-                if 'Overall Score' in master_df_with_ids.columns:
-                    master_df_with_ids.drop(columns=['Overall Score'], inplace=True)
+        # Display the table for each overall score
+        if selected_overall_scores:
+            for score_type, df, filepath in outputs['overall_score_tables']:
+                st.write(f"### {score_type} Table")
 
-                # Strip ': Overall Score' from column headers
-                new_columns = {}
-                for col in master_df_with_ids.columns:
-                    new_col = col.replace(': Overall Score', '')
-                    new_columns[col] = new_col
-                master_df_with_ids.rename(columns=new_columns, inplace=True)
+                show_table(df, f"overall_{score_type}", score_columns(df))
 
-                # Provide download button for master table with IDs
-                csv_with_ids = master_df_with_ids.to_csv(index=False).encode('utf-8')
+                # Provide download button for individual table
                 st.download_button(
-                    label="Download Master Table with IDs as CSV",
-                    data=csv_with_ids,
-                    file_name='master_overall_scores_with_ids.csv',
-                    mime='text/csv'
+                    label=f"Download {score_type} Table as CSV",
+                    data=table_files[filepath],
+                    file_name=os.path.basename(filepath),
+                    mime='text/csv',
+                    on_click='ignore'
                 )
+        else:
+            st.write("Please select at least one column or overall score to generate charts.")
 
-                # Add to overall_tables
-                overall_tables.append(('Overall Tables/master_overall_scores_with_ids.csv', master_df_with_ids))
-            else:
-                st.write("No overall scores (excluding 'Average') selected for the master table.")
-
-            # Generate per-provider charts
-            if selected_columns:
-                for provider_name, provider_info in speed_test_data_per_provider.items():
-                    labels, data_values = provider_info.get('data', ([], []))
-                    article_name = provider_info.get('article_name', 'VPN Analysis')
-
-                    # Assign color based on provider name
-                    vpn_colors = {
-                        'nordvpn': 'rgba(62, 95, 255, 0.8)',
-                        'surfshark': 'rgba(30, 191, 191, 0.8)',
-                        'expressvpn': 'rgba(218, 57, 64, 0.8)',
-                        'ipvanish': 'rgba(112, 187, 68, 0.8)',
-                        'cyberghost': 'rgba(255, 204, 0.8)',
-                        'purevpn': 'rgba(133, 102, 231, 0.8)',
-                        'protonvpn': 'rgba(109, 74, 255, 0.8)',
-                        'privatevpn': 'rgba(159, 97, 185, 0.8)',
-                        'pia': 'rgba(109, 200, 98, 0.8)',
-                        'hotspot shield': 'rgba(109, 192, 250, 0.8)',
-                        'strongvpn': 'rgba(238, 170, 29, 0.8)'
-                    }
-                    provider_color = vpn_colors.get(provider_name.lower(), 'rgba(75, 192, 192, 0.8)')
-
-                    # Generate unique IDs
-                    chart_id = f"{provider_name}_chart_{uuid.uuid4().hex[:6]}"
-
-                    # Prepare datasets
-                    datasets = [{
-                        'label': provider_name,
-                        'data': data_values,
-                        'backgroundColor': [provider_color] * len(labels),
-                        'borderColor': [provider_color] * len(labels),
-                        'borderWidth': 1
-                    }]
-
-                    # Generate chart title
-                    chart_title = f"{provider_name} Speed Tests for {article_name}"
-
-                    # Generate meta description
-                    meta_description = f"This chart shows the speed test results for {provider_name} when used for {article_name.lower()}."
-
-                    # Prepare the chart JS
-                    speed_test_chart_js = f"""
-                    <div id="{chart_id}" style="max-width: 405px; margin: 0 auto;">
-                        <canvas class="jschartgraphic" id="vpnSpeedChart_{chart_id}" width="405" height="400"></canvas>
-                    </div>
-                    <script>
-                        document.addEventListener('DOMContentLoaded', function() {{
-                            var ctx = document.getElementById('vpnSpeedChart_{chart_id}').getContext('2d');
-                            var vpnSpeedChart = new Chart(ctx, {{
-                                type: 'bar',
-                                data: {{
-                                    labels: {json.dumps(labels)},
-                                    datasets: {json.dumps(datasets)}
-                                }},
-                                options: {{
-                                    responsive: true,
-                                    plugins: {{
-                                        title: {{
-                                            display: true,
-                                            text: {json.dumps(chart_title)},
-                                            font: {{
-                                                size: 18
-                                            }}
-                                        }},
-                                        legend: {{
-                                            display: false
-                                        }},
-                                        tooltip: {{
-                                            callbacks: {{
-                                                label: function(context) {{
-                                                    if (context.raw <= 0.05500000000000001) {{
-                                                        return 'No data available';
-                                                    }}
-                                                    return context.dataset.label + ': ' + context.raw + ' Mbps';
-                                                }}
-                                            }}
-                                        }}
-                                    }},
-                                    scales: {{
-                                        y: {{
-                                            beginAtZero: true,
-                                            title: {{
-                                                display: true,
-                                                text: 'Mbps'
-                                            }}
-                                        }}
-                                    }}
-                                }}
-                            }});
-                        }});
-                    </script>
-                    """
-
-                    # Generate schema data with creator and license
-                    data_schema = {
-                        "@context": "http://schema.org",
-                        "@type": "Dataset",
-                        "name": chart_title,
-                        "description": meta_description,
-                        "creator": "Comparitech Ltd",
-                        "license": "https://creativecommons.org/licenses/by/4.0/",
-                        "data": {
-                            provider_name: {
-                                label: f"{value} Mbps" for label, value in zip(labels, data_values)
-                            }
-                        }
-                    }
-
-                    speed_test_chart_js += f"""
-                    <script type="application/ld+json">
-                    {json.dumps(data_schema, indent=4)}
-                    </script>
-                    """
-
-                    filename = sanitize_filename(f"{provider_name}_data_chart.txt")
-                    filepath = os.path.join('Provider Level Charts', filename)
-                    provider_level_charts.append((filepath, speed_test_chart_js))
-
-            # Generate overall score charts and display tables
-            if selected_overall_scores:
-                for score_type in selected_overall_scores:
-                    # Prepare data
-                    datasets = []
-                    labels = [score_type]
-                    # Retrieve the article name from overall_scores_data
-                    article_name = overall_scores_data.get(score_type, {}).get('article_name', 'VPN Analysis')
-                    score_table_data = []
-
-                    for provider_name in provider_names:
-                        score_value = overall_scores_data.get(score_type, {}).get(provider_name, 0)
-                        # Assign color based on provider name
-                        vpn_colors = {
-                            'nordvpn': 'rgba(62, 95, 255, 0.8)',
-                            'surfshark': 'rgba(30, 191, 191, 0.8)',
-                            'expressvpn': 'rgba(218, 57, 64, 0.8)',
-                            'ipvanish': 'rgba(112, 187, 68, 0.8)',
-                            'cyberghost': 'rgba(255, 204, 0.8)',
-                            'purevpn': 'rgba(133, 102, 231, 0.8)',
-                            'protonvpn': 'rgba(109, 74, 255, 0.8)',
-                            'privatevpn': 'rgba(159, 97, 185, 0.8)',
-                            'pia': 'rgba(109, 200, 98, 0.8)',
-                            'hotspot shield': 'rgba(109, 192, 250, 0.8)',
-                            'strongvpn': 'rgba(238, 170, 29, 0.8)'
-                        }
-                        provider_color = vpn_colors.get(provider_name.lower(), 'rgba(75, 192, 192, 0.8)')
-                        datasets.append({
-                            'label': provider_name,
-                            'data': [score_value],
-                            'backgroundColor': [provider_color],
-                            'borderColor': [provider_color],
-                            'borderWidth': 1
-                        })
-
-                        # Collect data for table
-                        score_table_data.append({'VPN Provider': provider_name, score_type: score_value})
-
-                    # Generate unique IDs
-                    chart_id = f"overall_{score_type.replace(' ', '_').lower()}_{uuid.uuid4().hex[:6]}"
-
-                    # Generate chart title
-                    chart_title = f"{score_type} for {article_name}"
-
-                    # Generate meta description
-                    meta_description = f"This chart shows the {score_type.lower()} for each VPN provider when used for {article_name.lower()}."
-
-                    # Prepare the chart JS
-                    overall_score_chart_js = f"""
-                    <div id="{chart_id}" style="max-width: 805px; margin: 0 auto;">
-                        <canvas class="jschartgraphic" id="vpnSpeedChart_{chart_id}" width="805" height="600"></canvas>
-                    </div>
-                    <script>
-                        document.addEventListener('DOMContentLoaded', function() {{
-                            var ctx = document.getElementById('vpnSpeedChart_{chart_id}').getContext('2d');
-                            var vpnSpeedChart = new Chart(ctx, {{
-                                type: 'bar',
-                                data: {{
-                                    labels: {json.dumps(labels)},
-                                    datasets: {json.dumps(datasets)}
-                                }},
-                                options: {{
-                                    responsive: true,
-                                    plugins: {{
-                                        title: {{
-                                            display: true,
-                                            text: {json.dumps(chart_title)},
-                                            font: {{
-                                                size: 18
-                                            }}
-                                        }},
-                                        legend: {{
-                                            display: true
-                                        }},
-                                        tooltip: {{
-                                            callbacks: {{
-                                                label: function(context) {{
-                                                    if (context.raw <= 0.05500000000000001) {{
-                                                        return 'No data available';
-                                                    }}
-                                                    return context.dataset.label + ': ' + context.raw + ' Score out of 10';
-                                                }}
-                                            }}
-                                        }}
-                                    }},
-                                    scales: {{
-                                        y: {{
-                                            beginAtZero: true,
-                                            title: {{
-                                                display: true,
-                                                text: 'Score out of 10'
-                                            }}
-                                        }}
-                                    }}
-                                }}
-                            }});
-                        }});
-                    </script>
-                    """
-
-                    # Generate schema data with creator and license
-                    data_schema = {
-                        "@context": "http://schema.org",
-                        "@type": "Dataset",
-                        "name": chart_title,
-                        "description": meta_description,
-                        "creator": "Comparitech Ltd",
-                        "license": "https://creativecommons.org/licenses/by/4.0/",
-                        "data": {
-                            provider_name: {
-                                labels[0]: f"{overall_scores_data.get(score_type, {}).get(provider_name, 0)} Score out of 10"
-                            } for provider_name in provider_names
-                        }
-                    }
-
-                    overall_score_chart_js += f"""
-                    <script type="application/ld+json">
-                    {json.dumps(data_schema, indent=4)}
-                    </script>
-                    """
-
-                    filename = sanitize_filename(f"{score_type}_chart.txt")
-                    filepath = os.path.join('Overall Charts', filename)
-                    overall_charts.append((filepath, overall_score_chart_js))
-
-                    # Display the table for this overall score
-                    st.write(f"### {score_type} Table")
-                    df = pd.DataFrame(score_table_data)
-
-                    # Convert numeric columns to floats
-                    numeric_columns = df.columns.drop('VPN Provider')
-                    df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
-
-                    # Sort df by the score_type column in descending order
-                    df = df.sort_values(by=score_type, ascending=False)
-                    df.reset_index(drop=True, inplace=True)
-
-                    # Apply formatting using Styler
-                    format_dict = {col: "{:.2f}" for col in numeric_columns}
-                    df_display = df.style.format(format_dict)
-                    st.dataframe(df_display)
-
-                    # Provide download button for individual table
-                    csv = df.to_csv(index=False).encode('utf-8')
-                    st.download_button(
-                        label=f"Download {score_type} Table as CSV",
-                        data=csv,
-                        file_name=f"{sanitize_filename(score_type.lower())}_table.csv",
-                        mime='text/csv'
-                    )
-
-                    # Add to overall_tables
-                    filepath = os.path.join('Overall Tables', f"{sanitize_filename(score_type.lower())}_table.csv")
-                    overall_tables.append((filepath, df))
-
+        # --- Provide Download Options ---
+        # ZIPs are only assembled when a button is clicked, and reused from the
+        # artifact cache unless the URL's rows or the selections changed
+        bundle_key = engine.bundle_key(
+            dataset, url, selected_columns, selected_overall_scores,
+            snapshot['provider-ids'], snapshot['Features Matrix'], image_formats
+        )
+        for label, file_name, members in engine.bundle_specs(url, outputs):
+            st.download_button(
+                label=label,
+                data=partial(engine.bundle_data, artifact_cache, bundle_key, file_name, members),
+                file_name=file_name,
+                mime="application/zip",
+                on_click='ignore'
+            )
+
+# The Features Matrix tables for the URL's providers. A fragment of its own:
+# changing the selections above never rebuilds or re-sends it.
+@st.fragment
+def features_section(feature_outputs):
+    with ensure_run('features'):
+        feature_tables, feature_table_files = feature_outputs
+        if not feature_tables:
+            st.write("No matching providers found in the Features Matrix for the given URL.")
+            return
+
+        table_files = dict(feature_table_files)
+        st.write("## Features Matrix Category Tables")
+        for category, table, filepath in feature_tables:
+            st.write(f"### {category} Category Table")
+            show_table(table, f"features_{category}")
+
+            # Provide a download button for each category table
+            st.download_button(
+                label=f"Download {category} Table as CSV",
+                data=table_files[filepath],
+                file_name=os.path.basename(filepath),
+                mime='text/csv',
+                on_click='ignore'
+            )
+
+# Comparison mode: the same selections for many URLs, built concurrently from
+# one parsed snapshot and downloaded as one ZIP with a folder per URL
+@st.fragment
+def comparison_selections(dataset, urls, snapshot, revision, image_formats):
+    with ensure_run('comparison'):
+        url_columns = [engine.list_columns(dataset, url) for url in urls]
+        headers_list = list(dict.fromkeys(header for columns in url_columns for header in columns['columns']))
+        overall_score_headers_list = list(dict.fromkeys(header for columns in url_columns for header in columns['overall_scores']))
+        with st.form('comparison_selections'):
+            st.write("Select the columns you want to include in the per-provider charts:")
+            selected_columns = st.multiselect("Available columns", headers_list)
+            st.write("Select the overall scores you want to export to charts:")
+            selected_overall_scores = st.multiselect("Available overall scores", overall_score_headers_list, default=overall_score_headers_list)
+            st.form_submit_button("Update comparison")
+
+        if not (selected_columns or selected_overall_scores):
+            st.write("Please select at least one column or overall score to generate charts.")
+            return
+
+        with stage('comparison', rows=len(urls)):
+            outputs_by_url, skipped = get_flights().do(
+                'comparison', (id(dataset), tuple(urls), tuple(selected_columns), tuple(selected_overall_scores), image_formats),
+                engine.build_comparison,
+                dataset, urls, selected_columns, selected_overall_scores,
+                snapshot['provider-ids'], snapshot['Features Matrix'], get_artifact_cache(),
+                image_formats=image_formats, executor=get_compare_pool(),
+                feature_pivots=get_feature_pivots(SHEET_URL, revision, snapshot['Features Matrix'])
+            )
+        for url, reason in skipped.items():
+            st.write(f"Skipped {url}: {reason}")
+        if not outputs_by_url:
+            return
+
+        st.write("## Comparison")
+        st.dataframe([
+            {
+                'URL': url,
+                'Providers': len(outputs['provider_names']),
+                'Chart files': len(outputs['chart_files']),
+                'Table files': len(outputs['table_files']),
+            }
+            for url, outputs in outputs_by_url.items()
+        ])
+        for url, outputs in outputs_by_url.items():
+            master_tables = outputs['master_tables']
+            if master_tables is not None:
+                with st.expander(f"Master Overall Scores Table: {url}"):
+                    show_table(master_tables['display_table'], f"comparison_{url}", score_columns(master_tables['display_table']))
+
+        # The combined ZIP is only assembled when the button is clicked
+        st.download_button(
+            label="Download Comparison as ZIP",
+            data=partial(engine.bundle_data, None, None, 'comparison.zip', engine.comparison_members(outputs_by_url)),
+            file_name='comparison.zip',
+            mime="application/zip",
+            on_click='ignore'
+        )
+
+# Function to show comparison mode. It always reads the full snapshot, also
+# with range-restricted fetches, since the URLs usually span many datasets.
+def comparison_section(image_formats):
+    st.write("Enter the URLs to compare, one per line:")
+    queries = [line.strip() for line in st.text_area("URLs", "").splitlines() if line.strip()]
+    if not queries:
+        st.write("Please enter the URLs to compare.")
+        return
+
+    with stage('fetch') as record:
+        revision = get_sheet_revision(SHEET_URL)
+        snapshot = load_snapshot(SHEET_URL, revision)
+        record['rows'] = count_rows(snapshot)
+    with stage('parse', rows=len(snapshot['Consolidated'])):
+        dataset = get_dataset(SHEET_URL, revision, snapshot)
+    with stage('url_search', rows=len(queries)):
+        url_search = get_url_search(SHEET_URL, revision)
+        resolved = {query: url_search.resolve(query) for query in queries}
+
+    not_found = [query for query, url in resolved.items() if url is None]
+    if not_found:
+        st.write("No data found for these URLs:")
+        st.write(not_found)
+    urls = list(dict.fromkeys(url for url in resolved.values() if url is not None))
+    if urls:
+        comparison_selections(dataset, urls, snapshot, revision, image_formats)
+
+# Prompt the user for a URL. The text is looked up in the URL search index
+# first: an exact match (ignoring scheme, 'www.', query string and trailing
+# slash) goes straight to extraction, otherwise the user confirms one of the
+# suggested URLs.
+def page_section(image_formats):
+    compare_mode = st.sidebar.toggle("Compare several URLs")
+    url_query = ''
+    input_url = None
+    if compare_mode:
+        comparison_section(image_formats)
+    else:
+        st.write("Enter the URL to find the corresponding VPN data:")
+        url_query = st.text_input("URL", "")
+
+    if url_query:
+        with stage('url_search'):
+            url_search = get_url_search(SHEET_URL, get_sheet_revision(SHEET_URL))
+            input_url = url_search.resolve(url_query)
+            suggestions = url_search.suggest(url_query) if input_url is None else []
+        if suggestions:
+            input_url = st.selectbox(
+                f"Matching URLs ({len(suggestions)} shown)", suggestions, index=None, placeholder="Choose a URL"
+            )
+        elif input_url is None:
+            st.write("No data found for the given URL.")
+
+    if input_url:
+        # Load the Google Sheet snapshot after URL is entered
+        with stage('fetch') as record:
+            revision = get_sheet_revision(SHEET_URL)
+            if RANGE_FETCH:
+                url_key = normalize_url(input_url)
+                snapshot = load_snapshot(SHEET_URL, revision, engine.RANGE_FETCH_WORKSHEETS)
+                consolidated_data = load_url_rows(SHEET_URL, revision, url_key)
             else:
-                st.write("Please select at least one column or overall score to generate charts.")
-
-            # --- Now, process the Features Matrix for the selected providers ---
-            # Load the Features Matrix data
-            features_matrix_sheet = sheet1.worksheet('Features Matrix')
-            features_matrix_data = features_matrix_sheet.get_all_values()
-
-            # Convert the Features Matrix data to a DataFrame
-            features_matrix_df = pd.DataFrame(features_matrix_data[1:], columns=features_matrix_data[0])
-
-            # Get the list of VPN Provider columns by excluding 'Category' and 'Feature'
-            provider_columns = [col for col in features_matrix_df.columns if col not in ['Category', 'Feature']]
-
-            # Filter the provider columns to include only those in provider_names
-            filtered_provider_columns = [col for col in provider_columns if col in provider_names]
-
-            # If no matching providers, inform the user
-            if not filtered_provider_columns:
-                st.write("No matching providers found in the Features Matrix for the given URL.")
+                snapshot = load_snapshot(SHEET_URL, revision)
+                consolidated_data = snapshot['Consolidated']
+            record['rows'] = count_rows(dict(snapshot, Consolidated=consolidated_data))
+
+        # Parse (or reuse) the dataset model
+        with stage('parse', rows=len(consolidated_data)):
+            if RANGE_FETCH:
+                dataset = get_url_dataset(SHEET_URL, revision, url_key, consolidated_data)
+                url_revision = revision
             else:
-                # Create a copy of the DataFrame with only the relevant providers
-                filtered_features_matrix_df = features_matrix_df[['Category', 'Feature'] + filtered_provider_columns]
-
-                # Now, group by 'Category' and prepare the transposed tables
-                grouped_data = filtered_features_matrix_df.groupby('Category')
-
-                # Prepare a dictionary to store each category's transposed table
-                category_tables = {}
-
-                # Iterate through each category and prepare the transposed tables
-                for category, data in grouped_data:
-                    # Set 'Feature' as index and transpose
-                    category_table = data.set_index('Feature').T
-
-                    # Reset index to get 'VPN Provider' as a column
-                    category_table = category_table.reset_index().rename(columns={'index': 'VPN Provider'})
-
-                    # Store the transposed table with the category name
-                    category_tables[category] = category_table
-
-                # Step 3: Display the features tables for each category underneath the overall scores tables
-                st.write("## Features Matrix Category Tables")
-
-                for category, table in category_tables.items():
-                    st.write(f"### {category} Category Table")
-                    st.dataframe(table)
-
-                    # Provide a download button for each category table
-                    csv = table.to_csv(index=False).encode('utf-8')
-                    st.download_button(
-                        label=f"Download {category} Table as CSV",
-                        data=csv,
-                        file_name=f"{category}_category_table.csv",
-                        mime='text/csv'
-                    )
-
-                    # Add to features_matrix_tables
-                    filepath = os.path.join('Features Matrix Tables', f"{category}_category_table.csv")
-                    features_matrix_tables.append((filepath, table))
-
-            # --- Provide Download Options at the end ---
-
-            # Provide download button for the zip file containing Chart.js files
-            if provider_level_charts or overall_charts:
-                zip_buffer = io.BytesIO()
-                with zipfile.ZipFile(zip_buffer, "w") as zf:
-                    # Add provider level charts
-                    for filepath, content in provider_level_charts:
-                        zf.writestr(filepath, content.encode('utf-8'))
-                    # Add overall charts
-                    for filepath, content in overall_charts:
-                        zf.writestr(filepath, content.encode('utf-8'))
-
-                # Provide download button for the generated chart files
-                st.download_button(
-                    label="Download Chart.js Files as ZIP",
-                    data=zip_buffer.getvalue(),
-                    file_name=f"{sanitize_filename(input_url.split('/')[-1])}_charts.zip",
-                    mime="application/zip"
-                )
+                dataset = get_dataset(SHEET_URL, revision, snapshot)
+                url_revision = get_url_revision(SHEET_URL, revision, snapshot, input_url)
 
-            # Provide download button for the tables zip
-            if features_matrix_tables or overall_tables:
-                zip_buffer = io.BytesIO()
-                with zipfile.ZipFile(zip_buffer, "w") as zf:
-                    # Add features matrix tables
-                    for filepath, df in features_matrix_tables:
-                        csv_content = df.to_csv(index=False).encode('utf-8')
-                        zf.writestr(filepath, csv_content)
-                    # Add overall tables
-                    for filepath, df in overall_tables:
-                        csv_content = df.to_csv(index=False).encode('utf-8')
-                        zf.writestr(filepath, csv_content)
-
-                # Provide download button
-                st.download_button(
-                    label="Download All Tables as ZIP",
-                    data=zip_buffer.getvalue(),
-                    file_name=f"{sanitize_filename(input_url.split('/')[-1])}_tables.zip",
-                    mime="application/zip"
-                )
-
-            # Provide download button for everything (charts and tables)
-            if (provider_level_charts or overall_charts) and (features_matrix_tables or overall_tables):
-                zip_buffer = io.BytesIO()
-                with zipfile.ZipFile(zip_buffer, "w") as zf:
-                    # Add charts
-                    for filepath, content in provider_level_charts:
-                        zf.writestr(os.path.join('Charts', filepath), content.encode('utf-8'))
-                    for filepath, content in overall_charts:
-                        zf.writestr(os.path.join('Charts', filepath), content.encode('utf-8'))
-                    # Add tables
-                    for filepath, df in features_matrix_tables:
-                        csv_content = df.to_csv(index=False).encode('utf-8')
-                        zf.writestr(os.path.join('Tables', filepath), csv_content)
-                    for filepath, df in overall_tables:
-                        csv_content = df.to_csv(index=False).encode('utf-8')
-                        zf.writestr(os.path.join('Tables', filepath), csv_content)
-
-                # Provide download button for everything zip
-                st.download_button(
-                    label="Download Everything",
-                    data=zip_buffer.getvalue(),
-                    file_name=f"{sanitize_filename(input_url.split('/')[-1])}_everything.zip",
-                    mime="application/zip"
-                )
+        # Collect the headers for the input URL
+        url_columns = engine.list_columns(dataset, input_url)
 
+        if not url_columns['provider_names']:
+            st.write("No data found for the given URL.")
         else:
-            st.write("Please select at least one column or overall score to generate charts.")
-
-else:
-    st.write("Please enter a URL to search for.")
+            feature_pivots = get_feature_pivots(SHEET_URL, revision, snapshot['Features Matrix'])
+            feature_outputs = get_feature_outputs(
+                SHEET_URL, url_revision, normalize_url(input_url), dataset, snapshot['Features Matrix'], feature_pivots
+            )
+            selections_section(dataset, input_url, url_columns, snapshot, feature_outputs, image_formats)
+            features_section(feature_outputs)
+
+    elif not url_query and not compare_mode:
+        st.write("Please enter a URL to search for.")
+
+# Run the page. The rerun's timings are recorded and the profiler is disabled
+# however the rerun ends: Streamlit stops a rerun (a newer rerun, st.stop(),
+# an error) by raising in the script thread, and a run left open would
+# collect the stages of every later fragment rerun of the session.
+with run('rerun') as run_metrics:
+    if profiler is not None:
+        try:
+            profiler.enable()
+        except ValueError:  # Another session is being profiled
+            profiler = None
+            st.sidebar.caption("Another rerun is being profiled; try again shortly.")
+    try:
+        page_section(image_formats)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+
+# Show the rerun's timings (and the profile) in the sidebar
+if show_timings:
+    with st.sidebar.expander("Stage timings", expanded=True):
+        st.caption(f"Rerun: {run_metrics.seconds:.3f}s, Sheets API calls: {run_metrics.sheets_calls}")
+        st.dataframe(run_metrics.stages)
+if profiler is not None:
+    profile_text = io.StringIO()
+    pstats.Stats(profiler, stream=profile_text).sort_stats('cumulative').print_stats(30)
+    with st.sidebar.expander("Profile", expanded=True):
+        st.code(profile_text.getvalue())
+        # Same format as Profile.dump_stats(); open with pstats or snakeviz
+        st.download_button(
+            label="Download profile (.prof)",
+            data=marshal.dumps(profiler.stats),
+            file_name='brand_rerun.prof',
+            mime='application/octet-stream'
+        )
@@ -0,0 +1,138 @@
+# Chart.js templates for the exported chart snippets.
+#
+# Every chart used to embed its own copy of the full `new Chart(ctx, {...})`
+# config. Now each snippet only carries a canvas and a compact JSON payload
+# (labels, datasets, title); CHART_BOOTSTRAP_HTML is added to the page once and
+# initializes every `.jschartgraphic` canvas from its payload. The per-kind
+# options (size, legend, units) live in the bootstrap, and the snippet templates
+# below are compiled once at import.
+
+import json
+import math
+from string import Template
+
+# Options per chart kind. The bootstrap reads 'legend' and 'unit'; width and
+# height are used for the canvas.
+CHART_KINDS = {
+    'provider': {'width': 405, 'height': 400, 'legend': False, 'unit': 'Mbps'},
+    'overall': {'width': 805, 'height': 600, 'legend': True, 'unit': 'Score out of 10'},
+}
+
+# Values at or below this are shown as 'No data available'
+NO_DATA_THRESHOLD = 0.05500000000000001
+
+# File name of the bootstrap inside the chart bundles
+CHART_BOOTSTRAP_FILE = 'chart_bootstrap.txt'
+
+# Shared script that renders every chart on the page. It is safe to include
+# more than once and renders charts added after the page has loaded too.
+CHART_BOOTSTRAP_HTML = Template("""<script>
+(function() {
+    if (window.vpnChartBootstrap) {
+        window.vpnChartBootstrap.renderAll();
+        return;
+    }
+    var kinds = $kinds;
+    function render(canvas) {
+        var payloadScript = document.getElementById(canvas.id + '_data');
+        if (!payloadScript || canvas.getAttribute('data-chart-ready')) {
+            return;
+        }
+        canvas.setAttribute('data-chart-ready', '1');
+        var payload = JSON.parse(payloadScript.textContent);
+        var kind = kinds[canvas.getAttribute('data-chart-kind')] || kinds.provider;
+        new Chart(canvas.getContext('2d'), {
+            type: 'bar',
+            data: {
+                labels: payload.labels,
+                datasets: payload.datasets.map(function(dataset) {
+                    var colors = dataset.data.map(function() { return dataset.color; });
+                    return {label: dataset.label, data: dataset.data, backgroundColor: colors, borderColor: colors, borderWidth: 1};
+                })
+            },
+            options: {
+                responsive: true,
+                plugins: {
+                    title: {display: true, text: payload.title, font: {size: 18}},
+                    legend: {display: kind.legend},
+                    tooltip: {
+                        callbacks: {
+                            label: function(context) {
+                                if (context.raw <= $no_data_threshold) {
+                                    return 'No data available';
+                                }
+                                return context.dataset.label + ': ' + context.raw + ' ' + kind.unit;
+                            }
+                        }
+                    }
+                },
+                scales: {
+                    y: {beginAtZero: true, title: {display: true, text: kind.unit}}
+                }
+            }
+        });
+    }
+    function renderAll() {
+        Array.prototype.forEach.call(document.querySelectorAll('canvas.jschartgraphic'), function(canvas) {
+            // One chart that fails to render must not stop the others
+            try {
+                render(canvas);
+            } catch (error) {
+                if (window.console) {
+                    console.error('Could not render chart ' + canvas.id, error);
+                }
+            }
+        });
+    }
+    window.vpnChartBootstrap = {renderAll: renderAll};
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', renderAll);
+    } else {
+        renderAll();
+    }
+})();
+</script>
+""").substitute(
+    kinds=json.dumps({kind: {'legend': options['legend'], 'unit': options['unit']} for kind, options in CHART_KINDS.items()}),
+    no_data_threshold=repr(NO_DATA_THRESHOLD),
+)
+
+CHART_SNIPPET_TEMPLATE = Template("""<!-- Requires Chart.js and the shared chart bootstrap ($bootstrap_file) once per page -->
+<div id="$chart_id" style="max-width: ${width}px; margin: 0 auto;">
+    <canvas class="jschartgraphic" id="vpnSpeedChart_$chart_id" data-chart-kind="$kind" width="$width" height="$height"></canvas>
+    <script type="application/json" id="vpnSpeedChart_${chart_id}_data">$payload</script>
+</div>
+<script type="application/ld+json">
+$schema
+</script>
+""")
+
+
+# Function to serialize JSON for embedding inside a <script> element
+def script_json(data, **kwargs):
+    return json.dumps(data, **kwargs).replace('</', '<\\/')
+
+
+# Function to turn a value JSON has no literal for (NaN, Infinity) into null.
+# Chart.js draws no bar for null and the tooltip shows 'No data available'.
+def finite_or_none(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+# Render a chart snippet. datasets are [{'label', 'data', 'color'}]; every
+# bar of a dataset gets its color.
+def render_chart_snippet(kind, chart_id, labels, datasets, title, data_schema):
+    options = CHART_KINDS[kind]
+    datasets = [dict(dataset, data=[finite_or_none(value) for value in dataset['data']]) for dataset in datasets]
+    payload = {'labels': labels, 'datasets': datasets, 'title': title}
+    return CHART_SNIPPET_TEMPLATE.substitute(
+        bootstrap_file=CHART_BOOTSTRAP_FILE,
+        chart_id=chart_id,
+        kind=kind,
+        width=options['width'],
+        height=options['height'],
+        payload=script_json(payload, separators=(',', ':'), allow_nan=False),
+        schema=script_json(data_schema, indent=4),
+    )
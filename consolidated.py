@@ -0,0 +1,392 @@
+# Helpers for working with the 'Consolidated' worksheet.
+#
+# The sheet is a stack of datasets. Each dataset starts with a header row whose
+# first cell is 'URL' (usually preceded by a 'Sheet: <article name>' row),
+# followed by one row per provider: URL, VPN provider, then the score columns.
+# parse_consolidated() walks the sheet once and turns it into DatasetBlocks that
+# the column picker and the chart extraction both read from.
+
+import functools
+import hashlib
+import json
+import sys
+
+import numpy as np
+
+# Define terms that are considered overall scores
+OVERALL_SCORE_TERMS = ['overall score', 'average']
+
+# Bytes per row hash
+ROW_HASH_SIZE = 8
+
+
+# Function to make titles more natural
+def make_title_natural(article_name):
+    article_name = article_name.strip()
+    if article_name.lower().startswith('how to'):
+        # Remove 'How to' and convert the next verb to gerund form
+        rest = article_name[6:].strip()  # Remove 'How to'
+        # Convert first word to gerund
+        words = rest.split()
+        if words:
+            first_word = words[0]
+            # Simple way to convert to gerund by adding 'ing'
+            if not first_word.endswith('ing'):
+                if first_word.endswith('e'):
+                    first_word = first_word[:-1] + 'ing'
+                else:
+                    first_word = first_word + 'ing'
+            words[0] = first_word
+            rest = ' '.join(words)
+        return rest
+    elif article_name.lower().startswith('best '):
+        return article_name  # Keep as is
+    else:
+        return article_name
+
+
+# Function to check whether a row is a dataset header row
+def is_header_row(row):
+    return bool(row and row[0] and row[0].strip().lower() == 'url')
+
+
+# Function to check whether a row is a provider row (has both a URL and a VPN Provider)
+def is_provider_row(row):
+    return bool(row and len(row) >= 2 and row[0] and row[1])
+
+
+# Function to normalize a URL before using it as an index key
+def normalize_url(url):
+    return url.strip()
+
+
+# Function to share the strings that repeat down the sheet (URLs, provider
+# names, header rows) between rows. Rows from the API or a snapshot file hold
+# a separate string per cell; compacted, a cached snapshot and its pickle are
+# much smaller.
+def compact_rows(rows):
+    return [
+        [sys.intern(cell) for cell in row] if is_header_row(row)
+        else [sys.intern(cell) if index < 2 else cell for index, cell in enumerate(row)]
+        for row in rows
+    ]
+
+
+# Function to convert a cell to a number the way float() reads it, None for blanks and text
+def to_number(value):
+    if value == '':
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+# Function to get the article name for a dataset from the row above its header
+def get_article_name(previous_row):
+    if previous_row and previous_row[0].startswith('Sheet:'):
+        raw_article_name = previous_row[0].replace('Sheet:', '').strip()
+        return make_title_natural(raw_article_name)
+    return 'VPN Analysis'
+
+
+# Function to hash a row's cells, used to detect changed input rows
+def hash_row(row):
+    return hashlib.blake2b('\x1f'.join(row).encode('utf-8'), digest_size=ROW_HASH_SIZE).digest()
+
+
+# What a header row determines, shared by every block with the same headers:
+# the overall score headers and where each score column sits. The first two
+# columns are URL and VPN provider; everything after is a score. When a header
+# repeats, the first occurrence wins.
+class HeaderLayout:
+    __slots__ = ('headers', 'overall_headers', 'column_positions', 'sheet_positions')
+
+    def __init__(self, headers):
+        self.headers = tuple(sys.intern(header) for header in headers)
+        self.overall_headers = tuple(header for header in self.headers if header and any(term in header.lower() for term in OVERALL_SCORE_TERMS))
+        self.sheet_positions = []
+        self.column_positions = {}
+        for col_index, header in enumerate(self.headers):
+            if col_index >= 2 and header not in self.column_positions:
+                self.column_positions[header] = len(self.sheet_positions)
+                self.sheet_positions.append(col_index)
+
+
+# Function to get the shared layout for a header row
+@functools.lru_cache(maxsize=4096)
+def header_layout(headers):
+    return HeaderLayout(headers)
+
+
+# One dataset from the Consolidated sheet: its header row plus the provider rows
+# below it. Once all rows are added, finalize() converts the score columns to a
+# numeric matrix in one go. Blocks are kept compact since a parsed snapshot is
+# cached for the life of the process: URLs and provider names are interned, the
+# header layout is shared between blocks, row hashes are packed into one bytes
+# object and the scores are one float matrix.
+class DatasetBlock:
+    __slots__ = ('article_name', 'layout', 'urls', 'providers', 'row_hashes', 'source_hash', 'values', 'numeric', '_rows')
+
+    def __init__(self, article_name, headers):
+        self.article_name = sys.intern(article_name)
+        self.layout = header_layout(tuple(headers))
+        self.urls = []
+        self.providers = []
+        self.row_hashes = bytearray()
+        self.source_hash = None
+        self.values = None
+        self.numeric = None
+        self._rows = []
+
+    @property
+    def headers(self):
+        return self.layout.headers
+
+    @property
+    def overall_headers(self):
+        return self.layout.overall_headers
+
+    @property
+    def column_positions(self):
+        return self.layout.column_positions
+
+    def add_row(self, row, row_hash):
+        self.urls.append(sys.intern(normalize_url(row[0])))
+        self.providers.append(sys.intern(row[1].strip()))
+        self.row_hashes += row_hash
+        self._rows.append(row)
+        return len(self.providers) - 1
+
+    # Function to get the hash of one row's cells
+    def row_hash(self, position):
+        return self.row_hashes[position * ROW_HASH_SIZE:(position + 1) * ROW_HASH_SIZE]
+
+    # Convert all score cells to numbers into one matrix. Values are kept
+    # unrounded; numeric marks the cells that held a number (blanks and text
+    # do not). A row whose score cells are all numbers is converted in one
+    # map(float) call; only rows with blanks or text go cell by cell.
+    def finalize(self):
+        sheet_positions = self.layout.sheet_positions
+        width = len(self.headers)
+        contiguous = sheet_positions == list(range(2, width))
+        numbers = []
+        numeric = []
+        for row in self._rows:
+            if contiguous and len(row) >= width:
+                cells = row[2:width]
+            else:
+                cells = [row[col_index] if col_index < len(row) else '' for col_index in sheet_positions]
+            try:
+                row_numbers = list(map(float, cells))
+            except (ValueError, TypeError):
+                row_numbers = [to_number(cell) for cell in cells]
+                numeric.extend([number is not None for number in row_numbers])
+            else:
+                numeric.extend([True] * len(row_numbers))
+            numbers.extend(row_numbers)
+        shape = (len(self._rows), len(sheet_positions))
+        self.numeric = np.array(numeric, dtype=bool).reshape(shape)
+        self.values = np.array(numbers, dtype=float).reshape(shape)  # None becomes NaN, masked by numeric
+        self.row_hashes = bytes(self.row_hashes)
+        self._rows = None
+
+    # Read the given columns for the given rows as lists, each value rounded
+    # with round(value, digits). Blank and text cells, and columns missing
+    # from this dataset's headers, are 0.
+    def take(self, headers, positions, digits):
+        value_cols = [self.column_positions.get(header) for header in headers]
+        result = []
+        for position in positions:
+            values = self.values[position].tolist()
+            numeric = self.numeric[position].tolist()
+            result.append([
+                round(values[col], digits) if col is not None and numeric[col] else 0 for col in value_cols
+            ])
+        return result
+
+
+# The parsed Consolidated sheet: all dataset blocks plus an index from
+# normalized URL to the (block, [row positions]) pairs where that URL appears.
+class ConsolidatedData:
+    __slots__ = ('blocks', 'url_index')
+
+    def __init__(self, blocks, url_index):
+        self.blocks = blocks
+        self.url_index = url_index
+
+    def lookup(self, url):
+        return self.url_index.get(normalize_url(url), [])
+
+    # A dataset holding only the blocks that contain the given URLs, small
+    # enough to send to a worker process
+    def subset(self, urls):
+        blocks = {}
+        url_index = {}
+        for url in urls:
+            entries = self.lookup(url)
+            if entries:
+                url_index[normalize_url(url)] = entries
+            for block, _ in entries:
+                blocks[id(block)] = block
+        return ConsolidatedData(list(blocks.values()), url_index)
+
+
+# Function to split the sheet into (article_name, header row, provider rows)
+# per dataset. Rows before the first header do not belong to any dataset;
+# empty rows and rows without a URL or VPN provider are skipped.
+def split_blocks(consolidated_data):
+    segments = []
+    for i, row in enumerate(consolidated_data):
+        if is_header_row(row):
+            previous_row = consolidated_data[i - 1] if i > 0 else []
+            segments.append((get_article_name(previous_row), row, []))
+        elif segments and is_provider_row(row):
+            segments[-1][2].append(row)
+    return segments
+
+
+# Function to hash everything a DatasetBlock is built from, given its rows' hashes
+def block_source_hash(article_name, headers, row_hashes):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([article_name, headers]).encode('utf-8'))
+    for row_hash in row_hashes:
+        digest.update(row_hash)
+    return digest.hexdigest()
+
+
+# Parse the Consolidated sheet in a single pass. When the previously parsed
+# dataset is given, blocks whose rows are unchanged are reused as they are and
+# only new or edited blocks are parsed.
+def parse_consolidated(consolidated_data, previous=None):
+    reusable = {}
+    for block in previous.blocks if previous is not None else []:
+        reusable.setdefault(block.source_hash, []).append(block)
+
+    blocks = []
+    for article_name, headers, rows in split_blocks(consolidated_data):
+        row_hashes = [hash_row(row) for row in rows]
+        source_hash = block_source_hash(article_name, headers, row_hashes)
+        if reusable.get(source_hash):
+            blocks.append(reusable[source_hash].pop(0))
+            continue
+        block = DatasetBlock(article_name, headers)
+        for row, row_hash in zip(rows, row_hashes):
+            block.add_row(row, row_hash)
+        block.finalize()
+        block.source_hash = source_hash
+        blocks.append(block)
+
+    url_index = {}
+    for block in blocks:
+        for position, url in enumerate(block.urls):
+            entries = url_index.setdefault(url, [])
+            if not entries or entries[-1][0] is not block:
+                entries.append((block, []))
+            entries[-1][1].append(position)
+    return ConsolidatedData(blocks, url_index)
+
+
+# Find the row spans [start, end) (0-based) of the datasets that contain a URL,
+# given only column A of the sheet. Each span starts at the row above the header
+# so the 'Sheet:' article name comes along; adjacent spans are merged.
+def find_url_ranges(column_a, url):
+    url = normalize_url(url)
+    header_indexes = [i for i, cell in enumerate(column_a) if is_header_row([cell])]
+    spans = []
+    for k, header_index in enumerate(header_indexes):
+        end = header_indexes[k + 1] if k + 1 < len(header_indexes) else len(column_a)
+        if not any(normalize_url(cell) == url for cell in column_a[header_index + 1:end]):
+            continue
+        start = max(header_index - 1, 0)
+        if spans and start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    return spans
+
+
+# Function to list the URLs in column A of the sheet, in sheet order: the
+# non-empty cells below a header row, except 'Sheet:' rows
+def column_urls(column_a):
+    urls = {}
+    in_dataset = False
+    for cell in column_a:
+        if is_header_row([cell]):
+            in_dataset = True
+        elif in_dataset and cell.strip() and not cell.startswith('Sheet:'):
+            urls.setdefault(normalize_url(cell), None)
+    return list(urls)
+
+
+# Function to iterate over (block, position, provider_name) for a URL, keeping
+# only the first row seen for each provider
+def iter_url_rows(dataset, url):
+    seen_providers = set()
+    for block, positions in dataset.lookup(url):
+        for position in positions:
+            provider_name = block.providers[position]
+            if provider_name in seen_providers:
+                continue
+            seen_providers.add(provider_name)
+            yield block, position, provider_name
+
+
+# Fingerprint the input rows for a URL (plus the headers and article names of
+# their datasets). It changes whenever any cell the URL's outputs read changes.
+def url_fingerprint(dataset, url):
+    digest = hashlib.blake2b(digest_size=16)
+    for block, positions in dataset.lookup(url):
+        digest.update(json.dumps([block.article_name, block.headers]).encode('utf-8'))
+        for position in positions:
+            digest.update(block.row_hash(position))
+    return digest.hexdigest()
+
+
+# Collect what the column pickers need for a URL: provider names, all headers
+# of the matching datasets and the overall score headers among them
+def get_url_headers(dataset, url):
+    matching_headers = set()
+    overall_score_headers = set()
+    for block, positions in dataset.lookup(url):
+        matching_headers.update(block.headers)
+        overall_score_headers.update(block.overall_headers)
+    provider_names = [provider_name for _, _, provider_name in iter_url_rows(dataset, url)]
+    return provider_names, matching_headers, overall_score_headers
+
+
+# List the columns offered for a URL: every header except 'URL' and 'VPN provider',
+# and the overall score headers, both sorted for presentation
+def list_url_columns(dataset, url):
+    provider_names, matching_headers, overall_score_headers = get_url_headers(dataset, url)
+    headers_list = sorted(header for header in matching_headers if header not in ['URL', 'VPN provider'])
+    return provider_names, headers_list, sorted(overall_score_headers)
+
+
+# Extract the selected columns (rounded to 2 decimals) and overall scores
+# (rounded to 1 decimal) for every provider of a URL, one column slice per block
+def extract_url_data(dataset, url, selected_columns, overall_columns):
+    # Group the provider rows by block so each block is sliced once
+    block_rows = []
+    for block, position, provider_name in iter_url_rows(dataset, url):
+        if not block_rows or block_rows[-1][0] is not block:
+            block_rows.append((block, [], []))
+        block_rows[-1][1].append(position)
+        block_rows[-1][2].append(provider_name)
+
+    provider_names = []
+    speed_test_data_per_provider = {}
+    overall_scores_data = {col: {} for col in overall_columns}
+    for block, positions, block_providers in block_rows:
+        selected_values = block.take(selected_columns, positions, 2)
+        overall_values = block.take(overall_columns, positions, 1)
+        for provider_name, provider_selected_data, provider_overall_data in zip(block_providers, selected_values, overall_values):
+            provider_names.append(provider_name)
+            speed_test_data_per_provider[provider_name] = {
+                'data': (list(selected_columns), provider_selected_data),
+                'article_name': block.article_name,
+            }
+            for col, score_value in zip(overall_columns, provider_overall_data):
+                overall_scores_data[col].setdefault('article_name', block.article_name)
+                overall_scores_data[col][provider_name] = score_value
+    return provider_names, speed_test_data_per_provider, overall_scores_data
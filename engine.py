@@ -0,0 +1,232 @@
+# Streamlit-free engine: everything between the Sheets API and the widgets.
+#
+# Each step takes and returns plain data (lists of rows, the parsed dataset,
+# DataFrames, (filepath, bytes) pairs), so the same code backs the Streamlit
+# page (brand.py, which only adds caching and widgets), the batch generator,
+# the benchmarks and worker processes, none of which import Streamlit.
+#
+#   backend = open_backend(snapshot_dir='snapshot/')
+#   snapshot = load_snapshot(backend)
+#   dataset = parse_dataset(snapshot['Consolidated'])
+#   columns = list_columns(dataset, url)
+#   outputs = build_outputs(dataset, url, columns['columns'][:2], columns['overall_scores'],
+#                           columns['overall_scores'], snapshot['provider-ids'], snapshot['Features Matrix'])
+#   bundles = build_bundles(url, outputs)
+
+import os
+
+import artifacts
+from consolidated import column_urls, compact_rows, extract_url_data, list_url_columns, parse_consolidated
+from instrumentation import InstrumentedBackend
+from quota import ScheduledBackend
+from sheets import SNAPSHOT_WORKSHEETS, GoogleSheetsBackend, fetch_column_index, fetch_url_rows
+from snapshot_store import LocalSnapshotBackend
+from url_search import URLPrefixIndex
+
+# The worksheets still fetched whole when Consolidated is fetched by range
+RANGE_FETCH_WORKSHEETS = tuple(title for title in SNAPSHOT_WORKSHEETS if title != 'Consolidated')
+
+
+# Compose a backend: a local snapshot, or the given gspread Spreadsheet (or
+# the one open_spreadsheet() opens on the first call) with its calls counted
+# and paced by the scheduler (falling back to fallback_dir on quota errors)
+def open_backend(spreadsheet=None, snapshot_dir=None, scheduler=None, fallback_dir=None, open_spreadsheet=None):
+    if snapshot_dir:
+        backend = InstrumentedBackend(LocalSnapshotBackend(snapshot_dir))
+    elif spreadsheet is not None or open_spreadsheet is not None:
+        backend = InstrumentedBackend(GoogleSheetsBackend(spreadsheet, open_spreadsheet))
+        if scheduler is not None:
+            fallback = LocalSnapshotBackend(fallback_dir) if fallback_dir else None
+            backend = ScheduledBackend(backend, scheduler, fallback)
+    else:
+        raise ValueError("Either a spreadsheet or a snapshot directory is required.")
+    return backend
+
+
+# Function to load {title: rows} for the worksheets the app reads, with the
+# repeated strings in Consolidated shared. The fetched dict is updated in
+# place, so a ScheduledBackend's last good result holds the compacted rows too.
+def load_snapshot(backend, titles=SNAPSHOT_WORKSHEETS):
+    worksheets = backend.fetch_worksheets(list(titles))
+    if 'Consolidated' in worksheets:
+        worksheets['Consolidated'] = compact_rows(worksheets['Consolidated'])
+    return worksheets
+
+
+# Function to load column A of Consolidated, the index for range-restricted fetches
+def load_column_index(backend):
+    return fetch_column_index(backend)
+
+
+# Function to load only the Consolidated rows of the datasets containing a URL
+def load_url_rows(backend, column_index, url):
+    return compact_rows(fetch_url_rows(backend, column_index, url))
+
+
+# Parse Consolidated rows into the dataset model
+def parse_dataset(consolidated_data):
+    return parse_consolidated(consolidated_data)
+
+
+# Apply a full snapshot as a delta on top of the last synced revision. Returns
+# the delta: the dataset, the URLs that depend on the change and the revision
+# each URL's inputs last changed at (see SyncState.apply).
+def sync_snapshot(sync_state, snapshot, revision):
+    return sync_state.apply(snapshot, revision)
+
+
+# Build the URL search index from the parsed dataset, or from column A of
+# Consolidated when only the column index has been fetched
+def build_url_search(dataset=None, column_index=None):
+    if dataset is not None:
+        return URLPrefixIndex(dataset.url_index)
+    return URLPrefixIndex(column_urls(column_index))
+
+
+# List what can be selected for a URL
+def list_columns(dataset, url):
+    provider_names, headers_list, overall_score_headers_list = list_url_columns(dataset, url)
+    return {'provider_names': provider_names, 'columns': headers_list, 'overall_scores': overall_score_headers_list}
+
+
+# Function to pick the selections for a URL. Requested columns and overall
+# scores the URL does not have are dropped; overall_scores=None means all.
+def resolve_selection(headers_list, overall_score_headers_list, columns, overall_scores):
+    selected_columns = [col for col in columns if col in headers_list]
+    if overall_scores is None:
+        selected_overall_scores = list(overall_score_headers_list)
+    else:
+        selected_overall_scores = [col for col in overall_scores if col in overall_score_headers_list]
+    return selected_columns, selected_overall_scores
+
+
+# Build the master tables for a URL from all of its overall scores (None when
+# it has none besides 'Average')
+def build_master_table(dataset, url, provider_ids_data):
+    _, _, overall_score_headers_list = list_url_columns(dataset, url)
+    provider_names, _, overall_scores_data = extract_url_data(dataset, url, [], overall_score_headers_list)
+    return artifacts.build_master_tables(
+        provider_names, overall_scores_data, overall_score_headers_list,
+        artifacts.build_provider_id_mapping(provider_ids_data)
+    )
+
+
+# Build the per-provider chart snippets for the selected columns as (filepath, bytes)
+def build_provider_charts(dataset, url, selected_columns, cache=None):
+    _, speed_test_data_per_provider, _ = extract_url_data(dataset, url, selected_columns, [])
+    return [
+        (filepath, content.encode('utf-8'))
+        for filepath, content in artifacts.build_provider_charts(speed_test_data_per_provider, cache)
+    ]
+
+
+# Build one chart snippet per selected overall score as (filepath, bytes)
+def build_overall_charts(dataset, url, selected_overall_scores, cache=None):
+    provider_names, _, overall_scores_data = extract_url_data(dataset, url, [], selected_overall_scores)
+    return [
+        (filepath, content.encode('utf-8'))
+        for filepath, content in artifacts.build_overall_charts(selected_overall_scores, provider_names, overall_scores_data, cache)
+    ]
+
+
+# Build the Features Matrix table per category for the URL's providers
+def build_feature_tables(dataset, url, features_matrix_data):
+    provider_names, _, _ = extract_url_data(dataset, url, [], [])
+    return artifacts.build_feature_tables(features_matrix_data, provider_names)
+
+
+# Pivot the Features Matrix by category, once per snapshot
+def build_feature_pivots(features_matrix_data):
+    return artifacts.FeatureMatrixPivots(features_matrix_data)
+
+
+# Build the Features Matrix tables and their CSVs for the URL's providers.
+# They do not depend on the selections, so callers can build them once per URL
+# and pass them to build_outputs.
+def build_feature_outputs(dataset, url, features_matrix_data, feature_pivots=None):
+    provider_names, _, _ = extract_url_data(dataset, url, [], [])
+    return artifacts.build_feature_outputs(features_matrix_data, provider_names, feature_pivots)
+
+
+# Build every chart and table for a URL in one go (see artifacts.build_url_outputs)
+def build_outputs(dataset, url, selected_columns, selected_overall_scores, overall_score_headers_list,
+                  provider_ids_data, features_matrix_data, cache=None, image_formats=(), executor=None,
+                  feature_outputs=None, feature_pivots=None):
+    return artifacts.build_url_outputs(
+        dataset, url, selected_columns, selected_overall_scores, overall_score_headers_list,
+        provider_ids_data, features_matrix_data, cache, image_formats=image_formats, executor=executor,
+        feature_outputs=feature_outputs, feature_pivots=feature_pivots
+    )
+
+
+# Build the outputs for several URLs from one parsed dataset, each with the
+# selected columns and overall scores it has. The URLs' columns are read in one
+# pass over the dataset; with an executor (a process pool) the outputs are then
+# built concurrently, each worker receiving only the blocks that contain its
+# URL. Returns {url: outputs} in the given order and {url: reason} for the URLs
+# that were skipped.
+def build_comparison(dataset, urls, selected_columns, selected_overall_scores, provider_ids_data, features_matrix_data,
+                     cache=None, image_formats=(), executor=None, feature_pivots=None):
+    jobs = {}
+    skipped = {}
+    for url in urls:
+        url_columns = list_columns(dataset, url)
+        if not url_columns['provider_names']:
+            skipped[url] = "No data found for the given URL."
+            continue
+        url_selected_columns, url_selected_overall_scores = resolve_selection(
+            url_columns['columns'], url_columns['overall_scores'], selected_columns, selected_overall_scores
+        )
+        if not url_selected_columns and not url_selected_overall_scores:
+            skipped[url] = "None of the selected columns or overall scores exist for this URL."
+            continue
+        jobs[url] = (
+            dataset.subset([url]) if executor is not None else dataset, url, url_selected_columns,
+            url_selected_overall_scores, url_columns['overall_scores'], provider_ids_data, features_matrix_data, cache
+        )
+
+    options = {'image_formats': image_formats, 'feature_pivots': feature_pivots}
+    if executor is None:
+        return {url: build_outputs(*job, **options) for url, job in jobs.items()}, skipped
+    futures = {url: executor.submit(build_outputs, *job, **options) for url, job in jobs.items()}
+    return {url: future.result() for url, future in futures.items()}, skipped
+
+
+# List the members of the combined bundle for a comparison: each URL's charts
+# and tables in a folder of its own, laid out like its everything bundle
+def comparison_members(outputs_by_url):
+    members = []
+    for url, outputs in outputs_by_url.items():
+        url_folder = artifacts.get_url_folder(url)
+        members += [(os.path.join(url_folder, 'Charts', filepath), content) for filepath, content in outputs['chart_files']]
+        members += [(os.path.join(url_folder, 'Tables', filepath), content) for filepath, content in outputs['table_files']]
+    return members
+
+
+# Key identifying a URL's bundles in the artifact cache
+def bundle_key(dataset, url, selected_columns, selected_overall_scores, provider_ids_data, features_matrix_data,
+               image_formats=()):
+    return artifacts.url_bundle_key(
+        dataset, url, selected_columns, selected_overall_scores, provider_ids_data, features_matrix_data, image_formats
+    )
+
+
+# List a URL's bundles as (label, file_name, members) without building them
+def bundle_specs(url, outputs):
+    return artifacts.get_bundle_specs(url, outputs)
+
+
+# Function to build one bundle's ZIP bytes, through the artifact cache when one is given
+def bundle_data(cache, key, file_name, members):
+    return artifacts.bundle_data(cache, key, file_name, members)
+
+
+# Build all of a URL's bundles as (label, file_name, ZIP bytes). The artifact
+# cache is only used together with a bundle key.
+def build_bundles(url, outputs, cache=None, key=None):
+    if key is None:
+        cache = None
+    return [
+        (label, file_name, bundle_data(cache, key, file_name, members))
+        for label, file_name, members in bundle_specs(url, outputs)
+    ]
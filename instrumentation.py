@@ -0,0 +1,149 @@
+# Lightweight stage timing for a page rerun (or a batch URL).
+#
+#   with instrumentation.run('rerun') as metrics:
+#       with instrumentation.stage('parse', rows=len(rows)) as record:
+#           ...
+#           record['bytes'] = len(output)
+#
+# Each stage records its wall time, rows processed, bytes produced and the
+# Sheets API calls made while it ran (counted by InstrumentedBackend). The
+# active run lives in a context variable, so builders deep in artifacts.py can
+# open stages without threading a parameter through. Outside a run, stages are
+# logged on their own; for example, a ZIP that is built lazily when its
+# download button is clicked. Finished runs are emitted as one JSON line on the
+# 'brand.instrumentation' logger.
+
+import contextvars
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('brand.instrumentation')
+
+_current_run = contextvars.ContextVar('brand_instrumentation_run', default=None)
+
+
+# Function to send the JSON records to stderr, one per line (safe to call repeatedly)
+def configure_json_logging(stream=sys.stderr):
+    if not any(getattr(handler, '_brand_json', False) for handler in logger.handlers):
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        handler._brand_json = True
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class RunMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.stages = []
+        self.sheets_calls = 0
+        self.sheets_call_methods = {}
+        self.seconds = None
+        self._start = time.perf_counter()
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self._start
+
+    def to_dict(self):
+        return {
+            'event': 'run',
+            'run': self.name,
+            'seconds': round(self.seconds, 6) if self.seconds is not None else None,
+            'sheets_calls': self.sheets_calls,
+            'sheets_call_methods': dict(self.sheets_call_methods),
+            'stages': self.stages,
+        }
+
+
+# Function to get the run being recorded in this context, if any
+def current_run():
+    return _current_run.get()
+
+
+# Start recording a run in this context. Pair with end_run(); run() does both.
+def begin_run(name):
+    metrics = RunMetrics(name)
+    return metrics, _current_run.set(metrics)
+
+
+# Stop recording a run and log it
+def end_run(metrics, token):
+    _current_run.reset(token)
+    metrics.finish()
+    logger.info(json.dumps(metrics.to_dict(), default=str))
+
+
+# Record one run; stages opened inside it are attached to it
+@contextmanager
+def run(name):
+    metrics, token = begin_run(name)
+    try:
+        yield metrics
+    finally:
+        end_run(metrics, token)
+
+
+# Record a run unless one is already active, e.g. for a Streamlit fragment,
+# which reruns either on its own or as part of a full rerun
+@contextmanager
+def ensure_run(name):
+    metrics = _current_run.get()
+    if metrics is not None:
+        yield metrics
+    else:
+        with run(name) as metrics:
+            yield metrics
+
+
+# Time one stage. The yielded record can be given 'rows' and 'bytes'.
+@contextmanager
+def stage(name, rows=None):
+    record = {'stage': name, 'rows': rows, 'bytes': None}
+    metrics = _current_run.get()
+    calls_before = metrics.sheets_calls if metrics is not None else 0
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = round(time.perf_counter() - start, 6)
+        if metrics is not None:
+            record['sheets_calls'] = metrics.sheets_calls - calls_before
+            metrics.stages.append(record)
+        else:
+            logger.info(json.dumps(dict(record, event='stage'), default=str))
+
+
+# Function to count one Sheets API call against the current run
+def record_sheets_call(method):
+    metrics = _current_run.get()
+    if metrics is not None:
+        metrics.sheets_calls += 1
+        metrics.sheets_call_methods[method] = metrics.sheets_call_methods.get(method, 0) + 1
+
+
+# Function to count the rows in a {title: rows} snapshot
+def count_rows(worksheets):
+    return sum(len(rows) for rows in worksheets.values())
+
+
+# Backend wrapper counting the calls that reach the wrapped backend. Wrap the
+# backend that talks to the API so that retries are counted too.
+class InstrumentedBackend:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get_revision(self):
+        record_sheets_call('get_revision')
+        return self.backend.get_revision()
+
+    def fetch_worksheets(self, titles):
+        record_sheets_call('fetch_worksheets')
+        return self.backend.fetch_worksheets(titles)
+
+    def fetch_ranges(self, ranges):
+        record_sheets_call('fetch_ranges')
+        return self.backend.fetch_ranges(ranges)
@@ -0,0 +1,181 @@
+# Quota-aware scheduling of Sheets API calls.
+#
+# Every Sheets call goes through a QuotaScheduler. It keeps a sliding
+# one-minute window of requests and paces calls to stay within the
+# per-minute budget: when the window is full, callers queue for the next free
+# slot. A call that still hits a 429 (or a transient 5xx) is retried with
+# jittered exponential backoff. When the next free slot is further away than
+# max_wait, or the retries run out on quota errors, ScheduledBackend serves
+# the last good result for that call (or a fallback backend such as a local
+# snapshot) instead of failing the page.
+#
+# Counters (calls, retries, throttled responses, time spent waiting, ...)
+# are exposed through metrics() for tuning.
+
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+# HTTP statuses worth retrying; 429 is the quota error
+QUOTA_STATUS = 429
+RETRY_STATUSES = {QUOTA_STATUS, 500, 502, 503}
+
+WINDOW_SECONDS = 60
+
+# Last good fetch_ranges results kept per backend, least recently used first
+# out. get_revision and fetch_worksheets keep one result per call, and the app
+# fetches worksheets in a couple of fixed sets.
+LAST_GOOD_RANGES = 64
+
+
+class QuotaExhausted(Exception):
+    pass
+
+
+# Function to get the HTTP status of a Sheets API error (gspread's APIError or a fake), if any
+def error_status(exc):
+    code = getattr(exc, 'code', None)
+    if isinstance(code, int):
+        return code
+    return getattr(getattr(exc, 'response', None), 'status_code', None)
+
+
+# Function to check whether an error means the quota (or the budget) ran out
+def is_quota_error(exc):
+    return isinstance(exc, QuotaExhausted) or error_status(exc) == QUOTA_STATUS
+
+
+class QuotaScheduler:
+    def __init__(self, requests_per_minute=60, max_retries=5, base_delay=1.0, max_delay=32.0, max_wait=15.0,
+                 clock=time.monotonic, sleep=time.sleep, rng=random.random):
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng
+        self._slots = deque()  # Start times of the calls in the current window, oldest first
+        self._lock = threading.Lock()
+        self._metrics = {
+            'calls': 0, 'retries': 0, 'throttled': 0, 'queued': 0,
+            'wait_seconds': 0.0, 'budget_exhausted': 0, 'fallbacks': 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._metrics[name] += amount
+
+    # Reserve the next free slot in the window and return how long to wait for it
+    def _reserve(self):
+        with self._lock:
+            now = self.clock()
+            while self._slots and now - self._slots[0] >= WINDOW_SECONDS:
+                self._slots.popleft()
+            if len(self._slots) < self.requests_per_minute:
+                self._slots.append(now)
+                return 0.0
+            start = self._slots[len(self._slots) - self.requests_per_minute] + WINDOW_SECONDS
+            wait = start - now
+            if wait > self.max_wait:
+                self._metrics['budget_exhausted'] += 1
+                raise QuotaExhausted(f"Sheets request budget exhausted; next slot in {wait:.0f}s")
+            self._slots.append(start)
+            self._metrics['queued'] += 1
+            return wait
+
+    # Call fn(*args, **kwargs) within the budget, retrying 429s and transient errors
+    def call(self, fn, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            wait = self._reserve()
+            if wait > 0:
+                self._count('wait_seconds', wait)
+                self.sleep(wait)
+            self._count('calls')
+            try:
+                return fn(*args, **kwargs)
+            except Exception as exc:
+                status = error_status(exc)
+                if status not in RETRY_STATUSES or attempt == self.max_retries:
+                    raise
+                if status == QUOTA_STATUS:
+                    self._count('throttled')
+                self._count('retries')
+                # Full jitter: a random delay up to the exponential backoff cap
+                delay = self.rng() * min(self.max_delay, self.base_delay * 2 ** attempt)
+                self._count('wait_seconds', delay)
+                self.sleep(delay)
+
+    def record_fallback(self):
+        self._count('fallbacks')
+
+    # Function to get a copy of the counters
+    def metrics(self):
+        with self._lock:
+            return dict(self._metrics, wait_seconds=round(self._metrics['wait_seconds'], 3))
+
+
+# Backend wrapper that sends every call through a QuotaScheduler. When a call
+# fails on quota, the last good result of the same call is returned, or the
+# fallback backend is asked instead. Results are kept as returned, not copied:
+# engine.load_snapshot() compacts the fetched worksheets in place, so the
+# last good workbook is the snapshot the app caches rather than a second copy.
+class ScheduledBackend:
+    def __init__(self, backend, scheduler, fallback=None, max_last_good_ranges=LAST_GOOD_RANGES):
+        self.backend = backend
+        self.scheduler = scheduler
+        self.fallback = fallback
+        self.max_last_good_ranges = max_last_good_ranges
+        self._last_good = {}
+        self._last_good_ranges = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Function to keep a call's result, dropping the least recently used ranges
+    def _remember(self, name, key, result):
+        with self._lock:
+            if name != 'fetch_ranges':
+                self._last_good[(name, key)] = result
+                return
+            self._last_good_ranges[key] = result
+            self._last_good_ranges.move_to_end(key)
+            if len(self._last_good_ranges) > self.max_last_good_ranges:
+                self._last_good_ranges.popitem(last=False)
+
+    # Function to get (True, result) for a call's last good result, (False, None) without one
+    def _recall(self, name, key):
+        with self._lock:
+            if name == 'fetch_ranges':
+                store, store_key = self._last_good_ranges, key
+            else:
+                store, store_key = self._last_good, (name, key)
+            if store_key not in store:
+                return False, None
+            return True, store[store_key]
+
+    def _call(self, name, key, *args):
+        try:
+            result = self.scheduler.call(getattr(self.backend, name), *args)
+        except Exception as exc:
+            if not is_quota_error(exc):
+                raise
+            found, last_good = self._recall(name, key)
+            if found:
+                self.scheduler.record_fallback()
+                return last_good
+            if self.fallback is not None:
+                self.scheduler.record_fallback()
+                return getattr(self.fallback, name)(*args)
+            raise
+        self._remember(name, key, result)
+        return result
+
+    def get_revision(self):
+        return self._call('get_revision', None)
+
+    def fetch_worksheets(self, titles):
+        return self._call('fetch_worksheets', tuple(titles), titles)
+
+    def fetch_ranges(self, ranges):
+        return self._call('fetch_ranges', tuple(ranges), ranges)
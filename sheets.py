@@ -0,0 +1,229 @@
+# Fetch layer for the Google Sheets workbook.
+#
+# The app only needs the full contents of a few worksheets plus the
+# spreadsheet's revision (last modified time). A backend provides exactly that:
+#
+#   backend.get_revision()             -> revision string
+#   backend.fetch_worksheets(titles)   -> {title: list of rows}
+#   backend.fetch_ranges(ranges)       -> [list of rows per A1 range]
+#
+# fetch_ranges() backs the range-restricted lookup: fetch_column_index() reads
+# only column A of Consolidated, and fetch_url_rows() then requests just the
+# row ranges of the datasets that contain a URL (see find_url_ranges).
+#
+# GoogleSheetsBackend talks to the Sheets API; FakeSheetsBackend serves rows
+# from memory so the rest of the app can run and be exercised offline.
+
+import copy
+import re
+import threading
+
+from consolidated import find_url_ranges
+
+# The workbook holding the Consolidated, provider-ids and Features Matrix sheets
+SHEET_URL = 'https://docs.google.com/spreadsheets/d/1ZhJhTJSzrdM2c7EoWioMkzWpONJNyalFmWQDSue577Q'
+
+# The worksheets the app reads
+SNAPSHOT_WORKSHEETS = ['Consolidated', 'provider-ids', 'Features Matrix']
+
+SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+
+# Function to build an authorized gspread client from service account info.
+# gspread and google-auth are imported here so that code paths which never
+# talk to Google (fake backend, idle page loads) do not pay for the import.
+# The client's AuthorizedSession refreshes the access token only once it expires.
+def authorize_client(credentials_info):
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    creds = Credentials.from_service_account_info(credentials_info, scopes=SCOPES)
+    return gspread.authorize(creds)
+
+
+# Function to quote a worksheet title for use as an A1 range
+def quote_title(title):
+    return "'{}'".format(title.replace("'", "''"))
+
+
+# Function to build an A1 range for a whole column of a worksheet
+def column_range(title, column='A'):
+    return f"{quote_title(title)}!{column}:{column}"
+
+
+# Function to build an A1 range for the whole rows [start, end) (0-based) of a worksheet
+def row_range(title, start, end):
+    return f"{quote_title(title)}!{start + 1}:{end}"
+
+
+# Function to split an A1 range into the worksheet title and the cell reference
+def split_range(a1_range):
+    title, _, reference = a1_range.rpartition('!')
+    if title.startswith("'") and title.endswith("'"):
+        title = title[1:-1].replace("''", "'")
+    return title, reference
+
+
+# Function to cut an A1 reference ('A:A' column or '5:20' rows) out of a
+# worksheet's rows, the way the Sheets API returns it (trailing blanks dropped)
+def slice_range(rows, reference):
+    column_match = re.fullmatch(r'([A-Z]+):\1', reference)
+    if column_match:
+        index = 0
+        for letter in column_match.group(1):
+            index = index * 26 + ord(letter) - ord('A') + 1
+        values = [[row[index - 1]] if len(row) >= index and row[index - 1] else [] for row in rows]
+    else:
+        row_match = re.fullmatch(r'(\d+):(\d+)', reference)
+        if not row_match:
+            raise ValueError(f"Unsupported range: {reference}")
+        values = [list(row) for row in rows[int(row_match.group(1)) - 1:int(row_match.group(2))]]
+    while values and not any(values[-1]):
+        values.pop()
+    return values
+
+
+# Function to pad rows to the same width, like Worksheet.get_all_values() does
+def pad_rows(values):
+    width = max((len(row) for row in values), default=0)
+    return [row + [''] * (width - len(row)) for row in values]
+
+
+# Backend reading from a gspread Spreadsheet. Given open_spreadsheet (a
+# function returning the Spreadsheet) instead, the spreadsheet is opened on
+# the first call, inside whatever paces and retries the backend's calls; a
+# failed open is tried again on the next call.
+class GoogleSheetsBackend:
+    def __init__(self, spreadsheet=None, open_spreadsheet=None):
+        self._spreadsheet = spreadsheet
+        self.open_spreadsheet = open_spreadsheet
+        self._lock = threading.Lock()
+
+    @property
+    def spreadsheet(self):
+        if self._spreadsheet is None:
+            with self._lock:
+                if self._spreadsheet is None:
+                    self._spreadsheet = self.open_spreadsheet()
+        return self._spreadsheet
+
+    # The spreadsheet is opened once per process, and Spreadsheet.lastUpdateTime
+    # is only read when it is opened; get_lastUpdateTime() asks Drive for the
+    # current value on every call
+    def get_revision(self):
+        return self.spreadsheet.get_lastUpdateTime()
+
+    # Fetch all worksheets in a single values:batchGet request
+    def fetch_worksheets(self, titles):
+        response = self.spreadsheet.values_batch_get([quote_title(title) for title in titles])
+        value_ranges = response.get('valueRanges', [])
+        return {title: pad_rows(value_range.get('values', [])) for title, value_range in zip(titles, value_ranges)}
+
+    # Fetch several A1 ranges in a single values:batchGet request
+    def fetch_ranges(self, ranges):
+        response = self.spreadsheet.values_batch_get(list(ranges))
+        return [value_range.get('values', []) for value_range in response.get('valueRanges', [])]
+
+
+# Backend serving worksheets from memory. edit_cell() and insert_rows()
+# simulate editors changing the workbook: each edit bumps the revision.
+class FakeSheetsBackend:
+    def __init__(self, worksheets, revision='1'):
+        self.worksheets = worksheets
+        self.revision = revision
+        self.fetch_count = 0
+        self.edit_count = 0
+
+    def _bump_revision(self):
+        self.edit_count += 1
+        self.revision = f"{self.revision.split('+')[0]}+{self.edit_count}"
+
+    # Set one cell (0-based row and column), growing the worksheet as needed
+    def edit_cell(self, title, row_index, col_index, value):
+        rows = self.worksheets.setdefault(title, [])
+        while len(rows) <= row_index:
+            rows.append([])
+        row = rows[row_index]
+        row.extend([''] * (col_index + 1 - len(row)))
+        row[col_index] = value
+        self._bump_revision()
+
+    # Insert rows before the given 0-based row index
+    def insert_rows(self, title, row_index, new_rows):
+        rows = self.worksheets.setdefault(title, [])
+        rows[row_index:row_index] = [list(row) for row in new_rows]
+        self._bump_revision()
+
+    def get_revision(self):
+        return self.revision
+
+    def fetch_worksheets(self, titles):
+        self.fetch_count += 1
+        return {title: pad_rows(copy.deepcopy(self.worksheets.get(title, []))) for title in titles}
+
+    def fetch_ranges(self, ranges):
+        self.fetch_count += 1
+        value_ranges = []
+        for a1_range in ranges:
+            title, reference = split_range(a1_range)
+            value_ranges.append(slice_range(copy.deepcopy(self.worksheets.get(title, [])), reference))
+        return value_ranges
+
+
+# Error raised by FlakySheetsBackend, shaped like gspread's APIError
+class FakeAPIError(Exception):
+    def __init__(self, code=429, message="Quota exceeded"):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+
+
+# Backend wrapper that injects API errors, for exercising retries and quota
+# handling offline. failures is how many 429s to raise before each call that
+# succeeds; fail_always makes every call fail.
+class FlakySheetsBackend:
+    def __init__(self, backend, failures=1, fail_always=False, code=429):
+        self.backend = backend
+        self.failures = failures
+        self.fail_always = fail_always
+        self.code = code
+        self.call_count = 0
+        self.error_count = 0
+        self._pending = failures
+
+    def _call(self, name, *args):
+        self.call_count += 1
+        if self.fail_always or self._pending > 0:
+            self._pending -= 1
+            self.error_count += 1
+            raise FakeAPIError(self.code)
+        self._pending = self.failures
+        return getattr(self.backend, name)(*args)
+
+    def get_revision(self):
+        return self._call('get_revision')
+
+    def fetch_worksheets(self, titles):
+        return self._call('fetch_worksheets', titles)
+
+    def fetch_ranges(self, ranges):
+        return self._call('fetch_ranges', ranges)
+
+
+# Function to read the column-A index of a worksheet: URLs, 'URL' headers and
+# 'Sheet:' markers, one cell per row
+def fetch_column_index(backend, title='Consolidated'):
+    values = backend.fetch_ranges([column_range(title)])[0]
+    return [row[0] if row else '' for row in values]
+
+
+# Fetch only the rows of the datasets that contain a URL, including their
+# header and 'Sheet:' rows, in one request. The result parses like the full
+# worksheet but holds just those datasets.
+def fetch_url_rows(backend, column_index, url, title='Consolidated'):
+    spans = find_url_ranges(column_index, url)
+    if not spans:
+        return []
+    rows = []
+    for values in backend.fetch_ranges([row_range(title, start, end) for start, end in spans]):
+        rows.extend(values)
+    return pad_rows(rows)
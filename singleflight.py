@@ -0,0 +1,74 @@
+# Process-wide request coalescing ("single flight").
+#
+# When several sessions ask for the same thing at once (the same popular URL
+# with the same selections), only the first caller does the work. The others
+# wait for its result instead of repeating it. Results are not kept once the
+# call finishes; caching stays with the artifact cache. Per-group counters
+# show how much was coalesced.
+#
+# Work done inside st.cache_data / st.cache_resource functions (the Sheets
+# calls, the snapshot sync and parsing) does not need this: Streamlit already
+# holds a lock per cache key while computing a value, so concurrent callers
+# of the same key wait for the first one.
+#
+#   flights = SingleFlight()
+#   flights.do('outputs', key, build, *args)
+
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._metrics = {}
+
+    def _count(self, group, name):
+        counters = self._metrics.setdefault(group, {'calls': 0, 'executed': 0, 'coalesced': 0, 'errors': 0})
+        counters[name] += 1
+
+    # Run fn(*args, **kwargs) for (group, key), or wait for the identical call
+    # already in flight and share its result (or its exception)
+    def do(self, group, key, fn, *args, **kwargs):
+        flight_key = (group, key)
+        with self._lock:
+            self._count(group, 'calls')
+            call = self._calls.get(flight_key)
+            leader = call is None
+            if leader:
+                call = self._calls[flight_key] = _Call()
+                self._count(group, 'executed')
+            else:
+                self._count(group, 'coalesced')
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as exc:
+            call.error = exc
+            with self._lock:
+                self._count(group, 'errors')
+            raise
+        finally:
+            with self._lock:
+                del self._calls[flight_key]
+            call.done.set()
+        return call.result
+
+    # Function to get a copy of the counters per group
+    def metrics(self):
+        with self._lock:
+            return {group: dict(counters) for group, counters in self._metrics.items()}
+
@@ -0,0 +1,163 @@
+# Local columnar snapshot store for the workbook.
+#
+# Each worksheet is written to an uncompressed Feather (Arrow IPC) file with one
+# string column per sheet column, so it can be memory-mapped on load instead of
+# re-downloading list-of-lists JSON from Google. A manifest records the source
+# revision and a content hash per worksheet, which lets refresh_snapshot() skip
+# the download when the spreadsheet has not changed and rewrite only the
+# worksheets that did.
+#
+# LocalSnapshotBackend exposes the store through the same interface as the
+# backends in sheets.py, so brand.py can run against it with no network.
+#
+# Usage:
+#   python snapshot_store.py refresh <directory> --credentials service_account.json
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from quota import QuotaScheduler, ScheduledBackend
+from sheets import SHEET_URL, SNAPSHOT_WORKSHEETS, GoogleSheetsBackend, authorize_client, pad_rows, slice_range, split_range
+
+MANIFEST_FILE = 'manifest.json'
+
+
+# Function to hash a worksheet's contents
+def hash_rows(rows):
+    return hashlib.sha256(json.dumps(rows, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+# Function to get the file name used for a worksheet
+def worksheet_filename(title):
+    return hashlib.sha1(title.encode('utf-8')).hexdigest()[:12] + '.feather'
+
+
+# Function to read the manifest, or None if the store is empty
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Function to write a file atomically so readers never see a partial file.
+# Every write gets its own temp file, so concurrent writers never share one.
+def _replace_file(path, write):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.", suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+
+
+# Function to write one worksheet as a Feather file
+def write_worksheet(path, rows):
+    rows = pad_rows(rows)
+    width = len(rows[0]) if rows else 0
+    table = pa.table({str(col): pa.array([row[col] for row in rows], type=pa.string()) for col in range(width)})
+    _replace_file(path, lambda tmp_path: feather.write_feather(table, tmp_path, compression='uncompressed'))
+
+
+# Function to read one worksheet back as a list of rows
+def read_worksheet(path):
+    table = feather.read_table(path, memory_map=True)
+    columns = [column.to_pylist() for column in table.columns]
+    return [list(row) for row in zip(*columns)]
+
+
+# Write worksheets to the store. Worksheets whose contents hash is unchanged
+# are left alone; the manifest is written last.
+def write_snapshot(directory, worksheets, revision):
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory) or {'worksheets': {}}
+    written = []
+    for title, rows in worksheets.items():
+        content_hash = hash_rows(rows)
+        entry = manifest['worksheets'].get(title)
+        filename = worksheet_filename(title)
+        if entry and entry['hash'] == content_hash and os.path.exists(os.path.join(directory, filename)):
+            continue
+        write_worksheet(os.path.join(directory, filename), rows)
+        manifest['worksheets'][title] = {'file': filename, 'hash': content_hash, 'rows': len(rows)}
+        written.append(title)
+    manifest['revision'] = revision
+    manifest['written_at'] = time.time()
+    _replace_file(os.path.join(directory, MANIFEST_FILE), lambda tmp_path: _write_json(tmp_path, manifest))
+    return written
+
+
+# Bring the store up to date with a backend. Nothing is downloaded when the
+# backend's revision matches the stored one. Returns the titles rewritten.
+def refresh_snapshot(directory, backend, titles=SNAPSHOT_WORKSHEETS):
+    revision = backend.get_revision()
+    manifest = read_manifest(directory)
+    if manifest and manifest.get('revision') == revision and all(title in manifest['worksheets'] for title in titles):
+        return []
+    return write_snapshot(directory, backend.fetch_worksheets(titles), revision)
+
+
+# Backend serving worksheets from the local store
+class LocalSnapshotBackend:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def get_revision(self):
+        manifest = read_manifest(self.directory)
+        if manifest is None:
+            raise FileNotFoundError(f"No snapshot found in {self.directory}")
+        return manifest['revision']
+
+    def fetch_worksheets(self, titles):
+        manifest = read_manifest(self.directory)
+        if manifest is None:
+            raise FileNotFoundError(f"No snapshot found in {self.directory}")
+        worksheets = {}
+        for title in titles:
+            entry = manifest['worksheets'].get(title)
+            worksheets[title] = read_worksheet(os.path.join(self.directory, entry['file'])) if entry else []
+        return worksheets
+
+    def fetch_ranges(self, ranges):
+        parsed = [split_range(a1_range) for a1_range in ranges]
+        worksheets = self.fetch_worksheets(sorted({title for title, _ in parsed}))
+        return [slice_range(worksheets[title], reference) for title, reference in parsed]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain a local snapshot of the branding workbook.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    refresh_parser = subparsers.add_parser('refresh', help="Download the workbook if it changed since the last snapshot")
+    refresh_parser.add_argument('directory')
+    refresh_parser.add_argument('--credentials', required=True, help="Path to a service account JSON file")
+    refresh_parser.add_argument('--sheet-url', default=SHEET_URL)
+    args = parser.parse_args()
+
+    with open(args.credentials, encoding='utf-8') as f:
+        client = authorize_client(json.load(f))
+    scheduler = QuotaScheduler(max_wait=float('inf'))
+    backend = ScheduledBackend(GoogleSheetsBackend(scheduler.call(client.open_by_url, args.sheet_url)), scheduler)
+    written = refresh_snapshot(args.directory, backend)
+    if written:
+        print(f"Updated: {', '.join(written)}")
+    else:
+        print("Snapshot is up to date.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+# Server-side rendering of the exported bar charts to static SVG and PNG.
+#
+# The images follow the Chart.js output: provider colors, the chart title, the
+# 'Mbps' / 'Score out of 10' axis titles, a legend for overall charts, and
+# 'No data' for values at or below NO_DATA_THRESHOLD or not finite (cells
+# holding 'nan' or 'inf'). Since a static image has no tooltips, each bar is
+# labelled with its value.
+#
+# SVG is generated in pure Python. PNG conversion uses cairosvg, which needs
+# the system cairo library (see packages.txt); without it only SVGs are made.
+# render_chart_images() can spread the work over a process pool.
+
+import math
+import re
+from xml.sax.saxutils import escape
+
+from chart_templates import CHART_KINDS, NO_DATA_THRESHOLD
+
+FONT_FAMILY = 'Helvetica, Arial, sans-serif'
+TEXT_COLOR = '#666666'
+GRID_COLOR = '#e5e5e5'
+
+# Approximate width of one character at 12px, used to fit labels
+CHAR_WIDTH = 6.5
+
+
+# Function to check whether PNG rendering is available
+def png_available():
+    try:
+        import cairosvg  # noqa: F401
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+# Function to turn a CSS rgb()/rgba() color into an SVG color and opacity
+def split_color(color):
+    numbers = [float(value) for value in re.findall(r'[\d.]+', color)]
+    red, green, blue = (min(255, max(0, round(value))) for value in (numbers + [0, 0, 0])[:3])
+    opacity = numbers[3] if len(numbers) >= 4 else 1
+    return f"rgb({red}, {green}, {blue})", opacity
+
+
+# Function to pick a round axis maximum and step for the given maximum value
+def nice_scale(max_value, ticks=5):
+    if max_value <= 0:
+        return 1, 0.2
+    raw_step = max_value / ticks
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = next(factor * magnitude for factor in (1, 2, 2.5, 5, 10) if factor * magnitude >= raw_step)
+    return step * math.ceil(max_value / step), step
+
+
+# Function to format an axis tick or bar value
+def format_value(value):
+    return f"{value:g}"
+
+
+# Function to shorten a label to fit a width in pixels
+def fit_label(label, width):
+    max_chars = max(3, int(width / CHAR_WIDTH))
+    return label if len(label) <= max_chars else label[:max_chars - 1] + '…'
+
+
+def _text(x, y, text, size=12, anchor='middle', weight='normal', fill=TEXT_COLOR, transform=''):
+    transform_attr = f' transform="{transform}"' if transform else ''
+    return (
+        f'<text x="{x:.1f}" y="{y:.1f}" font-family="{FONT_FAMILY}" font-size="{size}" font-weight="{weight}" '
+        f'fill="{fill}" text-anchor="{anchor}"{transform_attr}>{escape(text)}</text>'
+    )
+
+
+# Render a bar chart to SVG. Takes the same labels/datasets/title as the
+# Chart.js payload: datasets are [{'label', 'data', 'color'}], one bar per
+# label per dataset.
+def render_chart_svg(kind, labels, datasets, title):
+    options = CHART_KINDS[kind]
+    width, height = options['width'], options['height']
+    parts = [_text(width / 2, 28, title, size=18, weight='bold')]
+
+    # Legend rows below the title, wrapped to the chart width
+    top = 44
+    if options['legend'] and datasets:
+        x, row_y = 20, top + 12
+        for dataset in datasets:
+            item_width = 18 + len(dataset['label']) * CHAR_WIDTH + 16
+            if x + item_width > width - 20 and x > 20:
+                x, row_y = 20, row_y + 20
+            fill, opacity = split_color(dataset['color'])
+            parts.append(f'<rect x="{x}" y="{row_y - 10}" width="12" height="12" fill="{fill}" fill-opacity="{opacity}"/>')
+            parts.append(_text(x + 18, row_y, dataset['label'], anchor='start'))
+            x += item_width
+        top = row_y + 14
+
+    # Plot area and y axis
+    left, right, bottom = 70, width - 20, height - 50
+    plot_top = top + 10
+    plot_height = bottom - plot_top
+    max_value = max((value for dataset in datasets for value in dataset['data'] if math.isfinite(value)), default=0)
+    axis_max, step = nice_scale(max_value)
+    tick = 0
+    while tick <= axis_max + step / 2:
+        y = bottom - plot_height * tick / axis_max
+        parts.append(f'<line x1="{left}" y1="{y:.1f}" x2="{right}" y2="{y:.1f}" stroke="{GRID_COLOR}"/>')
+        parts.append(_text(left - 8, y + 4, format_value(round(tick, 10)), anchor='end'))
+        tick += step
+    center_y = plot_top + plot_height / 2
+    parts.append(_text(20, center_y, options['unit'], transform=f"rotate(-90 20 {center_y:.1f})"))
+
+    # Bars: one group per label, one bar per dataset in each group
+    group_width = (right - left) / max(len(labels), 1)
+    bar_width = group_width * 0.8 / max(len(datasets), 1)
+    for label_index, label in enumerate(labels):
+        group_left = left + group_width * label_index + group_width * 0.1
+        for dataset_index, dataset in enumerate(datasets):
+            value = dataset['data'][label_index] if label_index < len(dataset['data']) else 0
+            x = group_left + bar_width * dataset_index
+            center_x = x + bar_width / 2
+            if not math.isfinite(value) or value <= NO_DATA_THRESHOLD:
+                parts.append(_text(center_x, bottom - 6, 'No data', size=10))
+                continue
+            bar_height = plot_height * min(value, axis_max) / axis_max
+            fill, opacity = split_color(dataset['color'])
+            parts.append(
+                f'<rect x="{x:.1f}" y="{bottom - bar_height:.1f}" width="{bar_width:.1f}" height="{bar_height:.1f}" '
+                f'fill="{fill}" fill-opacity="{opacity}" stroke="{fill}" stroke-width="1"/>'
+            )
+            parts.append(_text(center_x, bottom - bar_height - 5, format_value(value), size=11))
+        parts.append(_text(left + group_width * (label_index + 0.5), bottom + 18, fit_label(label, group_width)))
+    parts.append(f'<line x1="{left}" y1="{bottom}" x2="{right}" y2="{bottom}" stroke="{TEXT_COLOR}"/>')
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+        f'<rect width="100%" height="100%" fill="#ffffff"/>'
+        + ''.join(parts)
+        + '</svg>'
+    )
+
+
+# Image formats that can be rendered
+IMAGE_FORMATS = ('svg', 'png')
+
+
+# Render one chart to {format: bytes} for each requested format ('svg', 'png')
+def render_chart_image(kind, labels, datasets, title, formats=IMAGE_FORMATS):
+    svg = render_chart_svg(kind, labels, datasets, title).encode('utf-8')
+    images = {}
+    if 'svg' in formats:
+        images['svg'] = svg
+    if 'png' in formats:
+        import cairosvg
+        images['png'] = cairosvg.svg2png(bytestring=svg)
+    return images
+
+
+def _render_spec(spec, formats):
+    return render_chart_image(spec['kind'], spec['labels'], spec['datasets'], spec['title'], formats)
+
+
+# Render many charts. specs are dicts with kind, labels, datasets and title.
+# With an executor the charts are rendered in parallel. Returns the images in
+# the same order as specs.
+def render_chart_images(specs, formats=IMAGE_FORMATS, executor=None):
+    if executor is None or len(specs) < 2:
+        return [_render_spec(spec, formats) for spec in specs]
+    return list(executor.map(_render_spec, specs, [formats] * len(specs)))
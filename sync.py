@@ -0,0 +1,132 @@
+# Incremental delta sync of the workbook into the parsed data model.
+#
+# The Sheets API has no change feed for cell values, so a sync still reads the
+# worksheets (one batchGet, and only when the revision moved). Everything after
+# that is incremental. The new rows are diffed against the last synced ones,
+# and only the Consolidated blocks that changed are re-parsed (see
+# parse_consolidated(previous=...)). The result says which URLs depend on the
+# change: URLs in edited blocks, plus URLs whose providers' provider-ids rows or
+# Features Matrix columns changed. The state keeps, per URL, the revision its
+# inputs last changed at; per-URL caches keyed on it (the page's Features
+# Matrix tables) survive edits to other URLs. Artifact keys are built from the
+# same per-URL inputs (see url_bundle_key), so the other URLs keep their cached
+# charts and bundles too.
+
+import hashlib
+import threading
+
+from artifacts import build_provider_id_mapping, feature_columns
+from consolidated import hash_row, parse_consolidated
+from sheets import SNAPSHOT_WORKSHEETS
+
+
+# Worksheets whose rows are kept between syncs, to diff the providers they
+# describe. Consolidated is large and only remembered by its hash; its
+# blocks are diffed through the parsed dataset instead.
+REFERENCE_WORKSHEETS = ('provider-ids', 'Features Matrix')
+
+
+# Function to hash a worksheet's rows
+def worksheet_hash(rows):
+    digest = hashlib.blake2b(digest_size=16)
+    for row in rows:
+        digest.update(hash_row(row))
+    return digest.hexdigest()
+
+
+# Function to list the providers whose value differs between two {provider: value} mappings
+def changed_keys(old, new):
+    return {key for key in set(old) | set(new) if old.get(key) != new.get(key)}
+
+
+# Function to list the URLs that have any of the given providers
+def urls_with_providers(dataset, providers):
+    urls = set()
+    for block in dataset.blocks:
+        for url, provider_name in zip(block.urls, block.providers):
+            if provider_name in providers:
+                urls.add(url)
+    return urls
+
+
+# The synced state of the workbook: a hash of the last rows seen per
+# worksheet, the rows of the reference worksheets, the dataset parsed from
+# Consolidated and the revision each URL's inputs last changed at. Safe to
+# share between sessions.
+class SyncState:
+    def __init__(self):
+        self.revision = None
+        self.worksheet_hashes = {}
+        self.worksheets = {}
+        self.dataset = None
+        self.url_revisions = {}
+        self._lock = threading.Lock()
+
+    # Apply freshly fetched worksheets (all or some of them). Returns a delta:
+    # the changed worksheets, how many blocks were re-parsed or reused, the
+    # providers whose reference rows changed and the URLs that depend on the
+    # change, plus the updated dataset and a copy of the per-URL revisions as
+    # of this revision.
+    def apply(self, worksheets, revision):
+        with self._lock:
+            old_dataset = self.dataset
+            hashes = {title: worksheet_hash(rows) for title, rows in worksheets.items()}
+            changed_worksheets = [title for title, digest in hashes.items() if self.worksheet_hashes.get(title) != digest]
+            delta = {
+                'revision': revision,
+                'changed_worksheets': changed_worksheets,
+                'parsed_blocks': 0,
+                'reused_blocks': 0,
+                'changed_providers': set(),
+                'changed_urls': set(),
+            }
+
+            dataset = old_dataset
+            if 'Consolidated' in changed_worksheets or (dataset is None and 'Consolidated' in worksheets):
+                dataset = parse_consolidated(worksheets['Consolidated'], previous=old_dataset)
+                old_blocks = {id(block) for block in old_dataset.blocks} if old_dataset is not None else set()
+                new_blocks = {id(block) for block in dataset.blocks}
+                for block in dataset.blocks:
+                    if id(block) in old_blocks:
+                        delta['reused_blocks'] += 1
+                    else:
+                        delta['parsed_blocks'] += 1
+                        delta['changed_urls'].update(block.urls)
+                for block in old_dataset.blocks if old_dataset is not None else []:
+                    if id(block) not in new_blocks:
+                        delta['changed_urls'].update(block.urls)
+
+            if 'provider-ids' in changed_worksheets:
+                delta['changed_providers'] |= changed_keys(
+                    build_provider_id_mapping(self.worksheets.get('provider-ids', [])),
+                    build_provider_id_mapping(worksheets['provider-ids'])
+                )
+            if 'Features Matrix' in changed_worksheets:
+                delta['changed_providers'] |= changed_keys(
+                    feature_columns(self.worksheets.get('Features Matrix', [])),
+                    feature_columns(worksheets['Features Matrix'])
+                )
+            if dataset is not None and delta['changed_providers']:
+                delta['changed_urls'] |= urls_with_providers(dataset, delta['changed_providers'])
+
+            for url in delta['changed_urls']:
+                if dataset is not None and url in dataset.url_index:
+                    self.url_revisions[url] = revision
+                else:
+                    self.url_revisions.pop(url, None)
+
+            self.worksheet_hashes.update(hashes)
+            self.worksheets.update({title: rows for title, rows in worksheets.items() if title in REFERENCE_WORKSHEETS})
+            self.dataset = dataset
+            self.revision = revision
+            delta['dataset'] = dataset
+            delta['url_revisions'] = dict(self.url_revisions)
+            return delta
+
+    # Bring the state up to date with a backend. Nothing is fetched when the
+    # revision has not moved; otherwise the new rows are applied as a delta.
+    def sync(self, backend, titles=SNAPSHOT_WORKSHEETS):
+        revision = backend.get_revision()
+        if revision == self.revision and all(title in self.worksheet_hashes for title in titles):
+            return None
+        return self.apply(backend.fetch_worksheets(titles), revision)
@@ -0,0 +1,43 @@
+import os
+import threading
+
+from artifact_cache import ArtifactCache, make_key
+
+
+def test_threads_writing_the_same_key_all_succeed(tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    key = make_key('bundle', 'https://x.com/a/')
+    data = b'x' * 64 * 1024
+    errors = []
+    start = threading.Barrier(16)
+
+    def write():
+        start.wait()
+        try:
+            for _ in range(20):
+                cache.put(key, data)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert cache.get(key) == data
+    assert [name for name in os.listdir(os.path.join(str(tmp_path), key[:2])) if name.endswith('.tmp')] == []
+
+
+def test_get_or_build_builds_once(tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    calls = []
+
+    def build():
+        calls.append(1)
+        return b'chart'
+
+    assert cache.get_or_build('ab12', build) == b'chart'
+    assert ArtifactCache(str(tmp_path)).get_or_build('ab12', build) == b'chart'
+    assert calls == [1]
@@ -0,0 +1,30 @@
+import sys
+
+import pytest
+
+import batch
+
+
+def run_main(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['batch.py', *args])
+    with pytest.raises(SystemExit) as exit_info:
+        batch.main()
+    return exit_info.value.code
+
+
+def test_png_without_cairo_fails_before_loading(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(batch, 'png_available', lambda: False)
+    monkeypatch.setattr(batch, 'load_worksheets', lambda *args: pytest.fail("the workbook was loaded"))
+
+    assert run_main(monkeypatch, str(tmp_path / 'out'), '--snapshot-dir', str(tmp_path), '--images', 'svg', 'png') == 2
+    assert '--images png needs the cairo library' in capsys.readouterr().err
+
+
+def test_svg_only_does_not_need_cairo(monkeypatch, tmp_path):
+    monkeypatch.setattr(batch, 'png_available', lambda: False)
+    monkeypatch.setattr(batch, 'load_worksheets', lambda *args: {})
+    runs = []
+    monkeypatch.setattr(batch, 'run_batch', lambda *args, **kwargs: runs.append(kwargs['image_formats']) or [])
+
+    assert run_main(monkeypatch, str(tmp_path / 'out'), '--snapshot-dir', str(tmp_path), '--images', 'svg') == 0
+    assert runs == [('svg',)]
@@ -0,0 +1,31 @@
+import json
+import math
+import re
+
+import pytest
+
+from chart_templates import CHART_BOOTSTRAP_HTML, render_chart_snippet
+
+
+# Function to read a snippet's payload the way the bootstrap does (JSON.parse
+# has no NaN or Infinity)
+def parse_payload(snippet):
+    text = re.search(r'<script type="application/json" id="[^"]+_data">(.*?)</script>', snippet, re.S).group(1)
+
+    def reject(constant):
+        raise ValueError(f"JSON.parse rejects {constant}")
+
+    return json.loads(text, parse_constant=reject)
+
+
+@pytest.mark.parametrize('bad_value', [math.nan, math.inf, -math.inf])
+def test_non_finite_values_are_sent_as_null(bad_value):
+    datasets = [{'label': 'UK Speed: Download', 'data': [bad_value, 3.0, 0], 'color': 'rgba(54, 162, 235, 0.6)'}]
+    snippet = render_chart_snippet('provider', 'abc123', ['NordVPN', 'Surfshark', 'PIA'], datasets, 'Speed', {'data': {}})
+    assert parse_payload(snippet)['datasets'][0]['data'] == [None, 3.0, 0]
+    assert datasets[0]['data'][0] is bad_value  # The caller's datasets are left as they are
+
+
+def test_each_chart_renders_on_its_own():
+    render_all = CHART_BOOTSTRAP_HTML[CHART_BOOTSTRAP_HTML.index('function renderAll'):]
+    assert re.search(r'try \{\s*render\(canvas\);\s*\} catch', render_all)
@@ -0,0 +1,172 @@
+import math
+
+import pytest
+
+from consolidated import extract_url_data, find_url_ranges, list_url_columns, make_title_natural, parse_consolidated
+from synthetic import generate_workbook, workbook_urls
+
+
+# The extraction loop brand.py ran before the sheet was parsed into blocks,
+# kept as the reference for what the exported numbers must be
+def baseline_extract(consolidated_data, input_url, selected_columns, overall_score_headers_list):
+    provider_names = []
+    speed_test_data_per_provider = {}
+    overall_scores_data = {}
+    processed_providers = set()
+    i = 0
+    while i < len(consolidated_data):
+        row = consolidated_data[i]
+        if row and row[0] and row[0].strip().lower() == 'url':
+            article_name = 'VPN Analysis'
+            if i > 0:
+                previous_row = consolidated_data[i - 1]
+                if previous_row and previous_row[0].startswith('Sheet:'):
+                    article_name = make_title_natural(previous_row[0].replace('Sheet:', '').strip())
+            headers_row = row
+            i += 1
+            while i < len(consolidated_data):
+                provider_row = consolidated_data[i]
+                if provider_row and provider_row[0] and provider_row[0].strip().lower() == 'url':
+                    break
+                if not provider_row or len(provider_row) < 2 or not provider_row[0] or not provider_row[1]:
+                    i += 1
+                    continue
+                url = provider_row[0].strip()
+                provider_name = provider_row[1].strip()
+                if input_url.strip() != url.strip():
+                    i += 1
+                    continue
+                unique_provider_key = f"{url}_{provider_name}"
+                if unique_provider_key not in processed_providers:
+                    processed_providers.add(unique_provider_key)
+                    if provider_name not in provider_names:
+                        provider_names.append(provider_name)
+                    provider_selected_data = []
+                    for col in selected_columns:
+                        if col in headers_row:
+                            value = provider_row[headers_row.index(col)]
+                            try:
+                                value = float(value)
+                            except (ValueError, TypeError):
+                                value = 0
+                            provider_selected_data.append(round(value, 2))
+                        else:
+                            provider_selected_data.append(0)
+                    speed_test_data_per_provider[provider_name] = {
+                        'data': (list(selected_columns), provider_selected_data), 'article_name': article_name
+                    }
+                    for col in overall_score_headers_list:
+                        score_value = 0
+                        if col in headers_row:
+                            try:
+                                score_value = float(provider_row[headers_row.index(col)])
+                            except (ValueError, TypeError):
+                                score_value = 0
+                        score_value = round(score_value, 1)
+                        if col not in overall_scores_data:
+                            overall_scores_data[col] = {'article_name': article_name}
+                        overall_scores_data[col][provider_name] = score_value
+                i += 1
+            continue
+        i += 1
+    return provider_names, speed_test_data_per_provider, overall_scores_data
+
+
+# Function to compare two extractions exactly: same values and same types (0 stays an int)
+def assert_same_extraction(actual, expected):
+    assert repr(actual) == repr(expected)
+
+
+def test_exact_halves_round_like_python():
+    rows = [
+        ['Sheet: best-vpn'],
+        ['URL', 'VPN provider', 'UK Speed: Download', 'Overall Score', 'Value: Overall Score'],
+        ['https://x.com/a/', 'NordVPN', '123.455', '6.65', '0.15'],
+        ['https://x.com/a/', 'Surfshark', '2.675', '5.35', '8.25'],
+    ]
+    dataset = parse_consolidated(rows)
+    _, speed_test_data, overall_scores = extract_url_data(
+        dataset, 'https://x.com/a/', ['UK Speed: Download'], ['Overall Score', 'Value: Overall Score']
+    )
+    assert speed_test_data['NordVPN']['data'][1] == [round(123.455, 2)] == [123.45]
+    assert speed_test_data['Surfshark']['data'][1] == [2.67]
+    assert overall_scores['Overall Score']['NordVPN'] == 6.7
+    assert overall_scores['Overall Score']['Surfshark'] == 5.3
+    assert overall_scores['Value: Overall Score']['NordVPN'] == 0.1
+
+
+def test_blank_text_and_missing_cells_stay_int_zero():
+    rows = [
+        ['URL', 'VPN provider', 'UK Speed: Download', 'Overall Score'],
+        ['https://x.com/a/', 'NordVPN', '', 'N/A'],
+        ['https://x.com/a/', 'Surfshark', 'fast'],
+    ]
+    dataset = parse_consolidated(rows)
+    _, speed_test_data, overall_scores = extract_url_data(
+        dataset, 'https://x.com/a/', ['UK Speed: Download', 'US Speed: Download'], ['Overall Score']
+    )
+    for provider_name in ['NordVPN', 'Surfshark']:
+        values = speed_test_data[provider_name]['data'][1] + [overall_scores['Overall Score'][provider_name]]
+        assert values == [0, 0, 0]
+        assert all(type(value) is int for value in values)
+
+
+def test_number_formats_parse_like_float():
+    rows = [
+        ['URL', 'VPN provider', 'A', 'B', 'C', 'D'],
+        ['https://x.com/a/', 'NordVPN', ' 7.5 ', '1e2', '1_000', '-0.125'],
+    ]
+    dataset = parse_consolidated(rows)
+    _, speed_test_data, _ = extract_url_data(dataset, 'https://x.com/a/', ['A', 'B', 'C', 'D'], [])
+    assert speed_test_data['NordVPN']['data'][1] == [7.5, 100.0, 1000.0, -0.12]
+
+
+def test_nan_cells_match_baseline():
+    rows = [['URL', 'VPN provider', 'A'], ['https://x.com/a/', 'NordVPN', 'nan']]
+    dataset = parse_consolidated(rows)
+    _, speed_test_data, _ = extract_url_data(dataset, 'https://x.com/a/', ['A'], [])
+    assert math.isnan(speed_test_data['NordVPN']['data'][1][0])
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_extraction_matches_baseline_on_synthetic_workbook(seed):
+    rows = generate_workbook(blocks=30, seed=seed)['Consolidated']
+    # Overall scores typed with 2 decimals hit the exact-half cases
+    rows = [
+        [f"{float(cell):.2f}" if index >= 2 and cell.replace('.', '', 1).isdigit() else cell for index, cell in enumerate(row)]
+        for row in rows
+    ]
+    dataset = parse_consolidated(rows)
+    for url in workbook_urls({'Consolidated': rows}):
+        _, headers_list, overall_score_headers_list = list_url_columns(dataset, url)
+        assert_same_extraction(
+            extract_url_data(dataset, url, headers_list, overall_score_headers_list),
+            baseline_extract(rows, url, headers_list, overall_score_headers_list),
+        )
+
+
+# Column A of a sheet: a dataset with no 'Sheet:' row at the top, then two
+# named datasets, each after a blank separator
+COLUMN_A = [
+    'URL', 'https://x.com/a/', 'https://x.com/d/', '',
+    'Sheet: b', 'URL', 'https://x.com/b/', ' https://x.com/d/ ', '',
+    'Sheet: c', 'URL', 'https://x.com/a/', 'https://x.com/c/',
+]
+
+
+def test_url_ranges_start_at_the_row_above_the_header():
+    assert find_url_ranges(COLUMN_A, 'https://x.com/b/') == [(4, 10)]
+    assert find_url_ranges(COLUMN_A, 'https://x.com/c/') == [(9, 13)]
+    # The first header has no row above it
+    assert find_url_ranges(COLUMN_A, ' https://x.com/a/') == [(0, 5), (9, 13)]
+
+
+def test_adjacent_url_ranges_are_merged():
+    # The second dataset's span starts on its 'Sheet:' row, where the first ends
+    assert find_url_ranges(COLUMN_A, 'https://x.com/d/') == [(0, 10)]
+    assert find_url_ranges(['URL', 'https://x.com/a/', 'URL', 'https://x.com/a/'], 'https://x.com/a/') == [(0, 4)]
+
+
+def test_url_ranges_skip_urls_outside_datasets():
+    assert find_url_ranges(COLUMN_A, 'https://x.com/missing/') == []
+    assert find_url_ranges(['https://x.com/a/', 'URL', 'https://x.com/b/'], 'https://x.com/a/') == []
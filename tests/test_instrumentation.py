@@ -0,0 +1,26 @@
+import pytest
+
+from instrumentation import current_run, ensure_run, run, stage
+
+
+# Streamlit stops a rerun by raising in the script thread
+class StopRerun(Exception):
+    pass
+
+
+def test_interrupted_run_is_closed():
+    with pytest.raises(StopRerun):
+        with run('rerun') as interrupted:
+            with stage('fetch'):
+                raise StopRerun()
+    assert current_run() is None
+    assert interrupted.seconds is not None
+    assert [record['stage'] for record in interrupted.stages] == ['fetch']
+
+    # A later fragment rerun records a run of its own
+    with ensure_run('table') as metrics:
+        with stage('render'):
+            pass
+    assert metrics is not interrupted
+    assert interrupted.stages[-1]['stage'] == 'fetch'
+    assert current_run() is None
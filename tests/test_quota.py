@@ -0,0 +1,192 @@
+import pytest
+
+import engine
+from quota import QuotaExhausted, QuotaScheduler, ScheduledBackend
+from sheets import SNAPSHOT_WORKSHEETS, FakeAPIError, FakeSheetsBackend, FlakySheetsBackend
+from synthetic import generate_workbook
+
+
+# A monotonic clock that only moves when the scheduler sleeps
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+# Function to make a scheduler on a fake clock, with the jitter fixed
+def make_scheduler(clock, jitter=1.0, **kwargs):
+    return QuotaScheduler(clock=clock, sleep=clock.sleep, rng=lambda: jitter, **kwargs)
+
+
+def workbook():
+    return {'provider-ids': [['Provider', 'ID'], ['NordVPN', '1000']]}
+
+
+def test_quota_errors_are_retried_with_exponential_backoff():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, base_delay=1.0)
+    backend = FlakySheetsBackend(FakeSheetsBackend(workbook(), revision='r1'), failures=3)
+
+    assert scheduler.call(backend.get_revision) == 'r1'
+    assert clock.sleeps == [1.0, 2.0, 4.0]
+    assert backend.call_count == 4
+    metrics = scheduler.metrics()
+    assert (metrics['calls'], metrics['retries'], metrics['throttled'], metrics['wait_seconds']) == (4, 3, 3, 7.0)
+
+
+def test_backoff_is_jittered_and_capped():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, jitter=0.5, base_delay=1.0, max_delay=3.0, max_retries=6)
+    backend = FlakySheetsBackend(FakeSheetsBackend(workbook()), failures=5)
+
+    scheduler.call(backend.get_revision)
+    assert clock.sleeps == [0.5, 1.0, 1.5, 1.5, 1.5]
+
+
+def test_transient_server_errors_are_retried_but_not_counted_as_throttled():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    backend = FlakySheetsBackend(FakeSheetsBackend(workbook(), revision='r1'), failures=1, code=503)
+
+    assert scheduler.call(backend.get_revision) == 'r1'
+    assert scheduler.metrics()['retries'] == 1
+    assert scheduler.metrics()['throttled'] == 0
+
+
+def test_retries_give_up_after_max_retries():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, max_retries=2)
+    backend = FlakySheetsBackend(FakeSheetsBackend(workbook()), fail_always=True)
+
+    with pytest.raises(FakeAPIError):
+        scheduler.call(backend.get_revision)
+    assert backend.call_count == 3
+    assert len(clock.sleeps) == 2
+
+
+def test_other_errors_are_not_retried():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    backend = FlakySheetsBackend(FakeSheetsBackend(workbook()), failures=1, code=404)
+
+    with pytest.raises(FakeAPIError):
+        scheduler.call(backend.get_revision)
+    assert backend.call_count == 1
+    assert clock.sleeps == []
+
+
+def test_calls_queue_for_the_next_slot_in_the_window():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, requests_per_minute=2, max_wait=60.0)
+    backend = FakeSheetsBackend(workbook())
+
+    for _ in range(3):
+        scheduler.call(backend.get_revision)
+    assert clock.sleeps == [60.0]
+    assert scheduler.metrics()['queued'] == 1
+
+
+def test_budget_exhaustion_raises_without_calling():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, requests_per_minute=2, max_wait=10.0)
+    backend = FlakySheetsBackend(FakeSheetsBackend(workbook()), failures=0)
+
+    scheduler.call(backend.get_revision)
+    clock.now = 5.0
+    scheduler.call(backend.get_revision)
+    with pytest.raises(QuotaExhausted):
+        scheduler.call(backend.get_revision)
+    assert backend.call_count == 2
+    assert scheduler.metrics()['budget_exhausted'] == 1
+
+    # Once the oldest call leaves the window the budget is back
+    clock.now = 60.0
+    scheduler.call(backend.get_revision)
+    assert backend.call_count == 3
+    assert clock.sleeps == []
+
+
+def test_last_good_result_is_served_when_the_quota_runs_out():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, max_retries=1)
+    flaky = FlakySheetsBackend(FakeSheetsBackend(workbook()), failures=0)
+    backend = ScheduledBackend(flaky, scheduler)
+
+    first = backend.fetch_worksheets(['provider-ids'])
+    flaky.fail_always = True
+    assert backend.fetch_worksheets(['provider-ids']) == first
+    assert scheduler.metrics()['fallbacks'] == 1
+
+    # Last good results are kept per call: another range has none
+    with pytest.raises(FakeAPIError):
+        backend.fetch_ranges(['provider-ids!1:2'])
+
+
+def test_last_good_result_is_served_when_the_budget_is_exhausted():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, requests_per_minute=1, max_wait=0.0)
+    backend = ScheduledBackend(FakeSheetsBackend(workbook(), revision='r1'), scheduler)
+
+    assert backend.get_revision() == 'r1'
+    assert backend.get_revision() == 'r1'
+    metrics = scheduler.metrics()
+    assert (metrics['calls'], metrics['budget_exhausted'], metrics['fallbacks']) == (1, 1, 1)
+
+
+def test_fallback_backend_is_used_without_a_last_good_result():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, max_retries=1)
+    flaky = FlakySheetsBackend(FakeSheetsBackend(workbook(), revision='live'), fail_always=True)
+    fallback = FakeSheetsBackend(workbook(), revision='snapshot')
+    backend = ScheduledBackend(flaky, scheduler, fallback=fallback)
+
+    assert backend.get_revision() == 'snapshot'
+    assert backend.fetch_worksheets(['provider-ids']) == fallback.fetch_worksheets(['provider-ids'])
+    assert scheduler.metrics()['fallbacks'] == 2
+
+
+def test_errors_other_than_quota_are_not_hidden_by_the_fallback():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, max_retries=1)
+    flaky = FlakySheetsBackend(FakeSheetsBackend(workbook()), fail_always=True, code=503)
+    backend = ScheduledBackend(flaky, scheduler, fallback=FakeSheetsBackend(workbook()))
+
+    with pytest.raises(FakeAPIError):
+        backend.get_revision()
+    assert scheduler.metrics()['fallbacks'] == 0
+
+
+def test_last_good_ranges_are_bounded():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, max_retries=0)
+    flaky = FlakySheetsBackend(FakeSheetsBackend(workbook()), failures=0)
+    backend = ScheduledBackend(flaky, scheduler, max_last_good_ranges=2)
+
+    for row in (1, 2, 3):
+        backend.fetch_ranges([f"provider-ids!{row}:{row}"])
+    backend.fetch_ranges(['provider-ids!2:2'])  # Now the most recently used
+    backend.fetch_ranges(['provider-ids!4:4'])
+
+    flaky.fail_always = True
+    assert backend.fetch_ranges(['provider-ids!2:2']) == [[['NordVPN', '1000']]]
+    for evicted in ('provider-ids!1:1', 'provider-ids!3:3'):
+        with pytest.raises(FakeAPIError):
+            backend.fetch_ranges([evicted])
+
+
+def test_last_good_workbook_is_the_loaded_snapshot():
+    scheduler = make_scheduler(FakeClock())
+    flaky = FlakySheetsBackend(FakeSheetsBackend(generate_workbook(blocks=3)), failures=0)
+    backend = ScheduledBackend(flaky, scheduler)
+
+    snapshot = engine.load_snapshot(backend)
+    flaky.fail_always = True
+    last_good = backend.fetch_worksheets(list(SNAPSHOT_WORKSHEETS))
+    assert last_good['Consolidated'] is snapshot['Consolidated']
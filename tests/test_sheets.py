@@ -0,0 +1,130 @@
+import pytest
+
+import engine
+from consolidated import extract_url_data, list_url_columns, parse_consolidated
+from quota import QuotaScheduler
+from sheets import (
+    FakeAPIError, FakeSheetsBackend, GoogleSheetsBackend, fetch_column_index, fetch_url_rows, row_range, slice_range,
+    split_range,
+)
+from snapshot_store import write_snapshot
+from synthetic import generate_workbook, workbook_urls
+
+
+# A gspread Spreadsheet as far as revisions go: lastUpdateTime is the value read
+# when the spreadsheet was opened, get_lastUpdateTime() asks for the current one
+class EditedSpreadsheet:
+    def __init__(self):
+        self.modified_time = '2026-01-01T00:00:00.000Z'
+        self.lastUpdateTime = self.modified_time
+
+    def edit(self, modified_time):
+        self.modified_time = modified_time
+
+    def get_lastUpdateTime(self):
+        return self.modified_time
+
+
+def test_revision_follows_edits_after_open():
+    spreadsheet = EditedSpreadsheet()
+    backend = GoogleSheetsBackend(spreadsheet)
+    assert backend.get_revision() == '2026-01-01T00:00:00.000Z'
+    spreadsheet.edit('2026-01-02T09:30:00.000Z')
+    assert backend.get_revision() == '2026-01-02T09:30:00.000Z'
+
+
+def test_revision_follows_edits_through_the_shared_page_backend():
+    spreadsheet = EditedSpreadsheet()
+    backend = engine.open_backend(spreadsheet, scheduler=QuotaScheduler())
+    first = backend.get_revision()
+    spreadsheet.edit('2026-01-02T09:30:00.000Z')
+    assert backend.get_revision() != first
+
+
+def test_out_of_quota_open_is_served_from_the_fallback_snapshot(tmp_path):
+    write_snapshot(str(tmp_path), {'provider-ids': [['Provider', 'ID']]}, 'snapshot')
+    spreadsheet = EditedSpreadsheet()
+    opens = []
+
+    def open_spreadsheet():
+        opens.append(1)
+        if len(opens) == 1:
+            raise FakeAPIError(429)
+        return spreadsheet
+
+    scheduler = QuotaScheduler(max_retries=0)
+    backend = engine.open_backend(open_spreadsheet=open_spreadsheet, scheduler=scheduler, fallback_dir=str(tmp_path))
+    assert backend.get_revision() == 'snapshot'
+    assert scheduler.metrics()['fallbacks'] == 1
+
+    # The open is tried again on the next call, and only once it succeeds
+    assert backend.get_revision() == spreadsheet.modified_time
+    assert backend.get_revision() == spreadsheet.modified_time
+    assert len(opens) == 2
+
+
+def test_row_range_is_one_based_and_inclusive():
+    assert row_range('Consolidated', 0, 3) == "'Consolidated'!1:3"
+    assert row_range("Editor's picks", 4, 5) == "'Editor''s picks'!5:5"
+    assert split_range(row_range("Editor's picks", 4, 5)) == ("Editor's picks", '5:5')
+
+
+def test_slice_range_drops_trailing_blank_rows():
+    rows = [['Sheet: a'], ['URL', 'VPN provider'], ['https://x.com/a/', 'NordVPN', '7'], ['', ''], []]
+    assert slice_range(rows, '2:3') == rows[1:3]
+    assert slice_range(rows, '1:5') == rows[:3]
+    assert slice_range(rows, '4:5') == []
+    assert slice_range(rows, 'A:A') == [['Sheet: a'], ['URL'], ['https://x.com/a/']]
+    assert slice_range(rows, 'C:C') == [[], [], ['7']]
+    with pytest.raises(ValueError):
+        slice_range(rows, 'A1:B2')
+
+
+def test_url_rows_are_fetched_with_the_row_above_the_header():
+    backend = FakeSheetsBackend({'Consolidated': [
+        ['Sheet: a'],
+        ['URL', 'VPN provider', 'Overall Score'],
+        ['https://x.com/a/', 'NordVPN', '8.1'],
+        [],
+        ['Sheet: b'],
+        ['URL', 'VPN provider', 'Overall Score', 'UK Speed: Download'],
+        ['https://x.com/b/', 'NordVPN'],
+        ['https://x.com/b/', 'Surfshark', '7.5', '71'],
+        [],
+        [],
+    ]})
+    column_index = fetch_column_index(backend)
+    assert column_index == ['Sheet: a', 'URL', 'https://x.com/a/', '', 'Sheet: b', 'URL', 'https://x.com/b/', 'https://x.com/b/']
+
+    # Trailing blank rows are cut and short rows padded to the widest one
+    assert fetch_url_rows(backend, column_index, 'https://x.com/b/') == [
+        ['Sheet: b', '', '', ''],
+        ['URL', 'VPN provider', 'Overall Score', 'UK Speed: Download'],
+        ['https://x.com/b/', 'NordVPN', '', ''],
+        ['https://x.com/b/', 'Surfshark', '7.5', '71'],
+    ]
+    assert fetch_url_rows(backend, column_index, 'https://x.com/missing/') == []
+
+
+# Function to drop the 'Sheet:' rows and blank separator rows from a generated workbook
+def strip_rows(workbook, sheet_rows, blank_rows):
+    rows = [
+        row for row in workbook['Consolidated']
+        if (sheet_rows or not row[0].startswith('Sheet:')) and (blank_rows or any(row))
+    ]
+    return dict(workbook, Consolidated=rows)
+
+
+@pytest.mark.parametrize('sheet_rows', [True, False])
+@pytest.mark.parametrize('blank_rows', [True, False])
+def test_range_fetched_rows_extract_like_the_full_sheet(sheet_rows, blank_rows):
+    workbook = strip_rows(generate_workbook(blocks=20, shared_url_rate=0.3, seed=4), sheet_rows, blank_rows)
+    backend = FakeSheetsBackend(workbook)
+    dataset = parse_consolidated(workbook['Consolidated'])
+    column_index = engine.load_column_index(backend)
+    for url in workbook_urls(workbook):
+        url_dataset = parse_consolidated(engine.load_url_rows(backend, column_index, url))
+        _, headers_list, overall_score_headers_list = list_url_columns(dataset, url)
+        assert list_url_columns(url_dataset, url)[1:] == (headers_list, overall_score_headers_list)
+        assert repr(extract_url_data(url_dataset, url, headers_list, overall_score_headers_list)) == \
+            repr(extract_url_data(dataset, url, headers_list, overall_score_headers_list))
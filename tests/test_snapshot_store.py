@@ -0,0 +1,42 @@
+import os
+import threading
+
+import pytest
+
+from snapshot_store import LocalSnapshotBackend, read_manifest, write_snapshot
+from synthetic import generate_workbook
+
+
+def test_concurrent_writers_each_get_their_own_temp_file(tmp_path):
+    directory = str(tmp_path)
+    workbooks = [generate_workbook(blocks=5, seed=seed) for seed in range(8)]
+    barrier = threading.Barrier(len(workbooks))
+    errors = []
+
+    def refresh(seed):
+        barrier.wait()
+        try:
+            write_snapshot(directory, workbooks[seed], f"r{seed}")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=refresh, args=(seed,)) for seed in range(len(workbooks))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert not [name for name in os.listdir(directory) if name.endswith('.tmp')]
+    worksheets = LocalSnapshotBackend(directory).fetch_worksheets(['provider-ids'])
+    assert worksheets['provider-ids'] in [workbook['provider-ids'] for workbook in workbooks]
+
+
+def test_failed_write_leaves_the_old_file_and_no_temp_file(tmp_path):
+    directory = str(tmp_path)
+    write_snapshot(directory, {'provider-ids': [['Provider', 'ID']]}, 'r1')
+    with pytest.raises(TypeError):
+        write_snapshot(directory, {'provider-ids': [['Provider', 'ID']]}, object())
+
+    assert read_manifest(directory)['revision'] == 'r1'
+    assert not [name for name in os.listdir(directory) if name.endswith('.tmp')]
@@ -0,0 +1,20 @@
+import math
+
+import pytest
+
+from static_charts import render_chart_svg
+
+
+@pytest.mark.parametrize('bad_value', [math.nan, math.inf, -math.inf])
+def test_non_finite_values_render_as_no_data(bad_value):
+    datasets = [{'label': 'UK Speed: Download', 'data': [bad_value, 3.0], 'color': 'rgba(54, 162, 235, 0.6)'}]
+    svg = render_chart_svg('provider', ['NordVPN', 'Surfshark'], datasets, 'Speed')
+    assert svg.count('No data') == 1
+    assert svg.count('<rect x=') == 1  # Only the finite bar is drawn
+    assert 'nan' not in svg and 'inf' not in svg
+
+
+def test_only_non_finite_values_render_an_empty_chart():
+    datasets = [{'label': 'Overall Score', 'data': [math.nan], 'color': 'rgb(255, 99, 132)'}]
+    svg = render_chart_svg('overall', ['NordVPN'], datasets, 'Overall Score')
+    assert 'No data' in svg
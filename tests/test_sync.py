@@ -0,0 +1,153 @@
+import copy
+import random
+
+import numpy as np
+import pytest
+
+from consolidated import is_header_row, parse_consolidated
+from sheets import FakeSheetsBackend
+from sync import SyncState, urls_with_providers
+from synthetic import generate_workbook
+
+
+# Function to compare a dataset with one parsed from scratch, block by block
+def assert_same_dataset(actual, expected):
+    assert len(actual.blocks) == len(expected.blocks)
+    for block, fresh in zip(actual.blocks, expected.blocks):
+        assert block.article_name == fresh.article_name
+        assert block.headers == fresh.headers
+        assert block.urls == fresh.urls
+        assert block.providers == fresh.providers
+        assert block.row_hashes == fresh.row_hashes
+        assert np.array_equal(block.numeric, fresh.numeric)
+        assert np.array_equal(block.values, fresh.values, equal_nan=True)
+    assert {url: [(actual.blocks.index(block), positions) for block, positions in entries] for url, entries in actual.url_index.items()} == \
+        {url: [(expected.blocks.index(block), positions) for block, positions in entries] for url, entries in expected.url_index.items()}
+
+
+# Function to parse the backend's Consolidated sheet from scratch
+def fresh_parse(backend):
+    return parse_consolidated(backend.fetch_worksheets(['Consolidated'])['Consolidated'])
+
+
+# Function to find the block a sheet row belongs to, as (header row index, provider row indexes)
+def block_rows(rows, row_index):
+    header_index = max(i for i in range(row_index + 1) if is_header_row(rows[i]))
+    end = next((i for i in range(header_index + 1, len(rows)) if is_header_row(rows[i])), len(rows))
+    return header_index, [i for i in range(header_index + 1, end) if rows[i] and rows[i][0] and not rows[i][0].startswith('Sheet:')]
+
+
+@pytest.fixture
+def synced():
+    backend = FakeSheetsBackend(generate_workbook(blocks=12, seed=1), revision='r1')
+    state = SyncState()
+    delta = state.sync(backend)
+    return backend, state, delta
+
+
+def test_first_sync_parses_every_block(synced):
+    backend, state, delta = synced
+    assert delta['parsed_blocks'] == len(state.dataset.blocks)
+    assert delta['reused_blocks'] == 0
+    assert delta['changed_urls'] == set(state.dataset.url_index)
+    assert set(delta['url_revisions'].values()) == {'r1'}
+    assert state.sync(backend) is None
+    assert backend.fetch_count == 1
+
+
+def test_cell_edit_reparses_only_its_block(synced):
+    backend, state, _ = synced
+    rows = backend.worksheets['Consolidated']
+    header_index, provider_indexes = block_rows(rows, 40)
+    backend.edit_cell('Consolidated', provider_indexes[0], 2, '12.5')
+
+    delta = state.sync(backend)
+    assert delta['changed_worksheets'] == ['Consolidated']
+    assert delta['parsed_blocks'] == 1
+    assert delta['reused_blocks'] == len(state.dataset.blocks) - 1
+    assert delta['changed_urls'] == {rows[i][0].strip() for i in provider_indexes}
+    assert_same_dataset(state.dataset, fresh_parse(backend))
+
+    for url, revision in delta['url_revisions'].items():
+        assert revision == (backend.revision if url in delta['changed_urls'] else 'r1')
+
+
+def test_inserted_dataset_is_parsed_and_the_rest_reused(synced):
+    backend, state, _ = synced
+    old_blocks = len(state.dataset.blocks)
+    backend.insert_rows('Consolidated', len(backend.worksheets['Consolidated']), [
+        ['Sheet: Best VPN for gaming'],
+        ['URL', 'VPN provider', 'UK Speed: Download', 'Overall Score'],
+        ['https://www.example.com/blog/vpn/gaming/', 'NordVPN', '88.1', '9.1'],
+        ['https://www.example.com/blog/vpn/gaming/', 'Surfshark', '71.4', '8.7'],
+    ])
+
+    delta = state.sync(backend)
+    assert delta['parsed_blocks'] == 1
+    assert delta['reused_blocks'] == old_blocks
+    assert delta['changed_urls'] == {'https://www.example.com/blog/vpn/gaming/'}
+    assert_same_dataset(state.dataset, fresh_parse(backend))
+
+
+def test_features_matrix_edit_marks_the_provider_urls(synced):
+    backend, state, _ = synced
+    header = backend.worksheets['Features Matrix'][0]
+    provider_name = header[3]
+    backend.edit_cell('Features Matrix', 2, 3, 'Maybe')
+
+    delta = state.sync(backend)
+    assert delta['changed_worksheets'] == ['Features Matrix']
+    assert delta['parsed_blocks'] == 0
+    assert delta['changed_providers'] == {provider_name}
+    assert delta['changed_urls'] == urls_with_providers(state.dataset, {provider_name})
+    assert 0 < len(delta['changed_urls']) < len(state.dataset.url_index)
+
+
+def test_provider_ids_edit_marks_the_provider_urls(synced):
+    backend, state, _ = synced
+    provider_name = backend.worksheets['provider-ids'][1][0]
+    backend.edit_cell('provider-ids', 1, 1, '4242')
+
+    delta = state.sync(backend)
+    assert delta['changed_providers'] == {provider_name}
+    assert delta['changed_urls'] == urls_with_providers(state.dataset, {provider_name})
+
+
+def test_removed_url_leaves_the_url_revisions(synced):
+    backend, state, _ = synced
+    rows = backend.worksheets['Consolidated']
+    header_index, provider_indexes = block_rows(rows, len(rows) - 1)
+    removed_urls = {rows[i][0].strip() for i in provider_indexes}
+    del rows[header_index - 1:]
+    backend.insert_rows('Consolidated', 0, [])  # Bumps the revision
+
+    delta = state.sync(backend)
+    assert delta['changed_urls'] == removed_urls
+    for url in removed_urls:
+        # URLs can appear in several datasets; only those now gone are dropped
+        if url in state.dataset.url_index:
+            assert delta['url_revisions'][url] == backend.revision
+        else:
+            assert url not in delta['url_revisions']
+    assert not set(delta['url_revisions']) - set(state.dataset.url_index)
+    assert_same_dataset(state.dataset, fresh_parse(backend))
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+def test_incremental_parse_matches_fresh_parse_after_random_edits(seed):
+    rng = random.Random(seed)
+    backend = FakeSheetsBackend(generate_workbook(blocks=10, seed=seed), revision='r1')
+    state = SyncState()
+    state.sync(backend)
+    for _ in range(15):
+        rows = backend.worksheets['Consolidated']
+        row_index = rng.randrange(len(rows))
+        action = rng.random()
+        if action < 0.6:
+            backend.edit_cell('Consolidated', row_index, rng.randrange(2, 8), rng.choice(['', 'N/A', '3.25', '71', '0.5']))
+        elif action < 0.8:
+            backend.insert_rows('Consolidated', row_index, [copy.deepcopy(rows[rng.randrange(len(rows))])])
+        else:
+            backend.edit_cell('Consolidated', row_index, 0, rng.choice(['URL', '', 'https://www.example.com/blog/vpn/new/']))
+        state.sync(backend)
+        assert_same_dataset(state.dataset, fresh_parse(backend))
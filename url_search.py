@@ -0,0 +1,71 @@
+# Type-ahead search over the article URLs of a snapshot.
+#
+# URLs are matched on a key that ignores the scheme, a leading 'www.', the
+# query string, the fragment, trailing slashes and case, so
+# 'https://www.example.com/blog/vpn/?utm_source=x' and 'example.com/blog/vpn'
+# find the same article. Keys are kept sorted, so the suggestions for what has
+# been typed so far are one binary search away. Every URL is indexed under
+# its full key and under its path alone, so typing the start of the path works
+# too.
+#
+#   url_search = URLPrefixIndex(urls)
+#   url_search.resolve('example.com/blog/vpn/')  # the sheet's URL, or None
+#   url_search.suggest('example.com/blog/v')     # up to 10 of the sheet's URLs
+
+import bisect
+from urllib.parse import urlsplit
+
+SUGGESTION_LIMIT = 10
+
+
+# Function to get the key a URL is matched on
+def url_match_key(url):
+    url = url.strip().lower()
+    if '://' not in url:
+        url = '//' + url.lstrip('/')
+    parts = urlsplit(url)
+    host = parts.netloc[4:] if parts.netloc.startswith('www.') else parts.netloc
+    return host + parts.path.rstrip('/')
+
+
+class URLPrefixIndex:
+    def __init__(self, urls):
+        self.urls_by_key = {}
+        entries = set()
+        for url in urls:
+            key = url_match_key(url)
+            if not key:
+                continue
+            key_urls = self.urls_by_key.setdefault(key, [])
+            if url not in key_urls:
+                key_urls.append(url)
+            entries.add((key, url))
+            path = key.partition('/')[2]
+            if path:
+                entries.add((path, url))
+        self._entries = sorted(entries)
+        self._keys = [key for key, _ in self._entries]
+
+    def __len__(self):
+        return len(self.urls_by_key)
+
+    # Function to get the sheet's URL for the text, None unless exactly one URL matches it
+    def resolve(self, text):
+        urls = self.urls_by_key.get(url_match_key(text), [])
+        return urls[0] if len(urls) == 1 else None
+
+    # Function to list the sheet's URLs whose full key or path starts with the text
+    def suggest(self, text, limit=SUGGESTION_LIMIT):
+        prefix = url_match_key(text)
+        if not prefix:
+            return []
+        suggestions = []
+        for index in range(bisect.bisect_left(self._keys, prefix), len(self._keys)):
+            if not self._keys[index].startswith(prefix):
+                break
+            url = self._entries[index][1]
+            if url not in suggestions:
+                suggestions.append(url)
+                if len(suggestions) == limit:
+                    break
+        return suggestions